@@ -0,0 +1,62 @@
+"""
+parse_date 微基准
+对比原来的 dateutil 解析与固定格式快速路径、缓存命中时的每行耗时
+
+    python benchmarks/bench_parse_date.py --rows 100000
+"""
+import os
+import sys
+import time
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.date_utils import parse_date, _parse_date_cached, _parse_date_fast, _parse_date_fallback  # noqa: E402
+
+
+def make_inputs(rows: int, days: int):
+    """模拟收益数据：多个产品共享同一段日期，格式以YYYY-MM-DD和YYYYMMDD为主"""
+    start = datetime.date(2020, 1, 1)
+    dates = [start + datetime.timedelta(days=i) for i in range(days)]
+    inputs = []
+    for i in range(rows):
+        date = dates[i % days]
+        inputs.append(date.isoformat() if i % 4 else date.strftime("%Y%m%d"))
+    return inputs
+
+
+def bench(name: str, func, inputs, before=None):
+    if before:
+        before()
+    start = time.perf_counter()
+    for value in inputs:
+        func(value)
+    elapsed = time.perf_counter() - start
+    per_row = elapsed / len(inputs) * 1e6
+    print(f"{name:<24} {elapsed:8.3f} 秒  {per_row:8.2f} 微秒/行")
+    return per_row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='parse_date 微基准')
+    parser.add_argument('--rows', type=int, default=100000, help='解析的行数')
+    parser.add_argument('--days', type=int, default=365, help='不同日期的数量')
+    args = parser.parse_args()
+
+    inputs = make_inputs(args.rows, args.days)
+    # 每行都不重复的输入，用于测量不命中缓存时的耗时
+    unique_inputs = make_inputs(args.rows, args.rows)
+
+    print(f"共 {args.rows} 行，{args.days} 个不同日期")
+    baseline = bench("dateutil（原实现）", _parse_date_fallback, inputs)
+    fast = bench("固定格式快速路径", _parse_date_fast, unique_inputs)
+    uncached = bench("parse_date（不命中缓存）", parse_date, unique_inputs, _parse_date_cached.cache_clear)
+    cached = bench("parse_date（含缓存）", parse_date, inputs, _parse_date_cached.cache_clear)
+
+    print(f"加速比: 快速路径 {baseline / fast:.1f}x，不命中缓存 {baseline / uncached:.1f}x，"
+          f"含缓存 {baseline / cached:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
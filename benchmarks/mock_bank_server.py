@@ -0,0 +1,316 @@
+"""
+模拟银行网站的本地服务器
+按工商银行融e行的页面结构（见 scrapers/specs/icbc.json）生成合成数据，
+提供产品列表页、JSON列表接口、产品详情页和收益接口，产品数量和响应延迟可配置
+
+    python benchmarks/mock_bank_server.py --products 10000 --latency 0.02 --port 8900
+
+启动后用 ICBCScraper(base_url="http://127.0.0.1:8900") 即可对其抓取
+"""
+import json
+import time
+import argparse
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse, parse_qs
+
+# 与工商银行网站一致的路径，scrapers/specs/icbc.json 和 icbc_scraper.py 中的地址换成本服务器后即指向这里
+FINANCING_PATH = "/ICBC/newperbank/perbank3/wealth/financing"
+LIST_PATH = f"{FINANCING_PATH}/financing_index.jsp"
+LIST_API_PATH = f"{FINANCING_PATH}/queryFinancingList.do"
+DETAIL_PATH = f"{FINANCING_PATH}/financing_detail.jsp"
+RETURNS_PATH = f"{FINANCING_PATH}/queryLingqianyieldList.do"
+
+# 列表页每页的产品数
+DEFAULT_PAGE_SIZE = 20
+
+# 收益接口每个产品最多返回的记录数
+DEFAULT_RETURNS_DAYS = 5
+
+PRODUCT_TYPES = ["固定收益类", "混合类", "现金管理类", "权益类"]
+RISK_LEVELS = ["R1", "R2", "R3", "R4"]
+PERIODS = ["7天", "30天", "90天", "180天", "365天"]
+STATUSES = ["在售", "募集中", "已售罄"]
+
+# 合成数据的基准日期，保证每次生成的内容一致
+BASE_DATE = datetime.date(2020, 1, 1)
+
+# 本服务器JSON列表接口对应的 list_api 定义，工商银行的真实接口未经确认，不在 specs/icbc.json 中启用；
+# 地址使用工商银行域名，由 ICBCScraper(base_url=...) 换成本服务器
+LIST_API_SPEC = {
+    "url": f"https://elife.icbc.com.cn{LIST_API_PATH}",
+    "page_param": "page",
+    "page_size_param": "pageSize",
+    "page_size": 200,
+    "items": "data.list",
+    "total": "data.total",
+    "required": ["product_code", "product_name"],
+    "fields": {
+        "product_name": {"key": "productName"},
+        "product_code": {"key": "productCode"},
+        "product_type": {"key": "productType"},
+        "risk_level": {"key": "riskLevel"},
+        "expected_return": {"key": "expectedReturn", "type": "float"},
+        "investment_horizon": {"key": "investmentPeriod"},
+        "details_url": {"key": "detailUrl", "type": "url"},
+    },
+}
+
+
+class MockBank:
+    """
+    合成的银行产品数据
+    第i个产品的所有字段由i确定，不同运行之间生成的页面完全相同
+    """
+
+    def __init__(self, products: int = 1000, page_size: int = DEFAULT_PAGE_SIZE,
+                 returns_days: int = DEFAULT_RETURNS_DAYS, max_api_page_size: Optional[int] = None):
+        self.products = products
+        self.page_size = page_size
+        self.returns_days = returns_days
+        # JSON列表接口在服务端限制的每页条数，模拟不按请求的pageSize返回的接口
+        self.max_api_page_size = max_api_page_size
+
+    def product_code(self, index: int) -> str:
+        return f"MOCK{index:08d}"
+
+    def product_index(self, code: str) -> Optional[int]:
+        try:
+            index = int(code[4:])
+        except ValueError:
+            return None
+        return index if code.startswith("MOCK") and 0 <= index < self.products else None
+
+    def product(self, index: int) -> Dict[str, Any]:
+        """列表中的产品条目"""
+        code = self.product_code(index)
+        return {
+            "productName": f"模拟理财产品{index}号",
+            "productCode": code,
+            "productType": PRODUCT_TYPES[index % len(PRODUCT_TYPES)],
+            "riskLevel": RISK_LEVELS[index % len(RISK_LEVELS)],
+            "expectedReturn": f"{2.5 + (index % 200) / 100:.2f}",
+            "investmentPeriod": PERIODS[index % len(PERIODS)],
+            "detailUrl": f"{DETAIL_PATH}?productCode={code}",
+        }
+
+    def nav(self, index: int, date: datetime.date) -> float:
+        """第index个产品在date的单位净值，随日期缓慢增长"""
+        days = (date - BASE_DATE).days
+        return round(1.0 + days * (0.00005 + (index % 50) * 0.000001), 4)
+
+    def list_page_html(self, page: int) -> str:
+        """第page页产品列表，最后一页的下一页按钮为禁用状态"""
+        start = (page - 1) * self.page_size
+        end = min(start + self.page_size, self.products)
+        items = []
+        for index in range(max(start, 0), end):
+            p = self.product(index)
+            items.append(
+                '<div class="product-item">'
+                f'<h3 class="product-name">{p["productName"]}</h3>'
+                f'<span class="product-code">{p["productCode"]}</span>'
+                f'<span class="product-type">{p["productType"]}</span>'
+                f'<span class="risk-level">{p["riskLevel"]}</span>'
+                f'<span class="expected-return">业绩比较基准 {p["expectedReturn"]}%</span>'
+                f'<span class="investment-period">{p["investmentPeriod"]}</span>'
+                f'<a class="detail-link" href="{p["detailUrl"]}">查看详情</a>'
+                '</div>'
+            )
+        next_class = "next" if end < self.products else "next disabled"
+        return (
+            '<html><head><title>理财产品</title></head><body>'
+            '<div class="header"><ul class="nav"><li>首页</li><li>理财</li><li>基金</li></ul></div>'
+            f'<div class="product-list">{"".join(items)}</div>'
+            f'<div class="pagination"><span class="current">{page}</span>'
+            f'<a class="{next_class}" href="{LIST_PATH}?page={page + 1}">下一页</a></div>'
+            '<div class="footer">中国工商银行 版权所有</div>'
+            '</body></html>'
+        )
+
+    def list_api_json(self, page: int, page_size: int) -> Dict[str, Any]:
+        if self.max_api_page_size:
+            page_size = min(page_size, self.max_api_page_size)
+        start = (page - 1) * page_size
+        end = min(start + page_size, self.products)
+        return {"data": {"list": [self.product(i) for i in range(max(start, 0), end)], "total": self.products}}
+
+    def detail_html(self, index: int) -> str:
+        p = self.product(index)
+        establishment = BASE_DATE + datetime.timedelta(days=index % 1000)
+        maturity = establishment + datetime.timedelta(days=365)
+        return (
+            '<html><head><title>产品详情</title></head><body>'
+            '<div class="header"><ul class="nav"><li>首页</li><li>理财</li></ul></div>'
+            f'<h1>{p["productName"]}</h1>'
+            '<table class="detail-table">'
+            f'<tr><th>起购金额</th><td class="min-investment">{1 + index % 5 * 10000}元</td></tr>'
+            f'<tr><th>产品状态</th><td class="product-status">{STATUSES[index % len(STATUSES)]}</td></tr>'
+            f'<tr><th>成立日</th><td class="establishment-date">{establishment.isoformat()}</td></tr>'
+            f'<tr><th>到期日</th><td class="maturity-date">{maturity.strftime("%Y年%m月%d日")}</td></tr>'
+            f'<tr><th>近一月年化</th><td class="actual-return">{p["expectedReturn"]}%</td></tr>'
+            '</table>'
+            f'<div class="product-description">{p["productName"]}主要投资于债券、存款等固定收益类资产。</div>'
+            '<div class="footer">中国工商银行 版权所有</div>'
+            '</body></html>'
+        )
+
+    def returns_json(self, index: int, start_date: Optional[datetime.date],
+                     end_date: Optional[datetime.date]) -> Dict[str, Any]:
+        """收益接口，返回结束日期往前最多returns_days天的净值"""
+        end_date = end_date or BASE_DATE + datetime.timedelta(days=365)
+        rows = []
+        for offset in range(self.returns_days):
+            date = end_date - datetime.timedelta(days=offset)
+            if start_date and date < start_date:
+                break
+            nav = self.nav(index, date)
+            previous = self.nav(index, date - datetime.timedelta(days=1))
+            week_ago = self.nav(index, date - datetime.timedelta(days=7))
+            rows.append({
+                "date": date.isoformat(),
+                "unitNetValue": f"{nav:.4f}",
+                "cumulativeNetValue": f"{nav + 0.01:.4f}",
+                "dailyReturn": f"{(nav / previous - 1) * 100:.4f}",
+                "sevenDayAnnualized": f"{((nav / week_ago) ** (365 / 7) - 1) * 100:.4f}",
+            })
+        return {"data": rows}
+
+
+class MockBankServer:
+    """
+    在后台线程中运行的模拟银行网站
+    latency为每个请求的固定延迟（秒），list_api为False时JSON列表接口返回404，爬虫改用HTML翻页
+    """
+
+    def __init__(self, bank: MockBank, latency: float = 0.0, list_api: bool = True,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.bank = bank
+        self.latency = latency
+        self.list_api = list_api
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "MockBankServer":
+        server = self
+
+        class MockBankHandler(BaseHTTPRequestHandler):
+            # 保持连接，和真实网站一样复用连接池
+            protocol_version = "HTTP/1.1"
+            # 响应头和响应体分两次写入，不关闭Nagle算法时每个请求会多等待一次延迟确认
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), MockBankHandler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, handler: BaseHTTPRequestHandler):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        parsed = urlparse(handler.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        bank = self.bank
+
+        if parsed.path == LIST_PATH:
+            self._send(handler, 200, bank.list_page_html(_int(query.get("page"), 1)))
+        elif parsed.path == LIST_API_PATH and self.list_api:
+            page_size = _int(query.get("pageSize"), DEFAULT_PAGE_SIZE)
+            self._send_json(handler, bank.list_api_json(_int(query.get("page"), 1), page_size))
+        elif parsed.path == DETAIL_PATH:
+            index = bank.product_index(query.get("productCode", ""))
+            if index is None:
+                self._send(handler, 404, "产品不存在")
+            else:
+                self._send(handler, 200, bank.detail_html(index))
+        elif parsed.path == RETURNS_PATH:
+            index = bank.product_index(query.get("productCode", ""))
+            if index is None:
+                self._send_json(handler, {"data": []})
+            else:
+                self._send_json(handler, bank.returns_json(index, _date(query.get("startDate")),
+                                                           _date(query.get("endDate"))))
+        else:
+            self._send(handler, 404, "页面不存在")
+
+    def _send_json(self, handler: BaseHTTPRequestHandler, data: Dict[str, Any]):
+        self._send(handler, 200, json.dumps(data, ensure_ascii=False), "application/json")
+
+    def _send(self, handler: BaseHTTPRequestHandler, status: int, text: str, content_type: str = "text/html"):
+        body = text.encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def _int(value: Optional[str], default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _date(value: Optional[str]) -> Optional[datetime.date]:
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟银行网站')
+    parser.add_argument('--products', type=int, default=1000, help='产品数量')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='列表页每页产品数')
+    parser.add_argument('--returns-days', type=int, default=DEFAULT_RETURNS_DAYS, help='每个产品返回的收益记录数')
+    parser.add_argument('--max-api-page-size', type=int, help='JSON列表接口每页最多返回的条数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的延迟（秒）')
+    parser.add_argument('--no-list-api', action='store_true', help='关闭JSON列表接口')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8900, help='监听端口')
+    args = parser.parse_args()
+
+    bank = MockBank(args.products, args.page_size, args.returns_days, args.max_api_page_size)
+    server = MockBankServer(bank, args.latency, not args.no_list_api, args.host, args.port).start()
+    print(f"模拟银行网站已启动: {server.base_url}，共 {args.products} 个产品")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+"""
+爬虫吞吐量基准
+在本地模拟银行网站上运行工商银行爬虫，并分别测量 parse_html、parse_date 和 DataProcessor.process_data，
+结果写入JSON文件，可与之前版本的结果对比
+
+    python benchmarks/run_benchmarks.py --sizes 1000,10000,100000 --output benchmarks/results/base.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/base.json
+
+BaseScraper.run 默认只测1000和10000个产品，每个产品需要请求详情和收益两次，
+10万个产品的完整抓取需要数分钟，可通过 --run-sizes 指定
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import datetime
+import platform
+import importlib
+import subprocess
+import contextlib
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 爬虫模块使用包内相对导入，需要以包的形式导入
+sys.path.insert(0, os.path.dirname(ROOT))
+PACKAGE = os.path.basename(ROOT)
+
+from mock_bank_server import MockBank, MockBankServer, BASE_DATE, LIST_API_SPEC  # noqa: E402
+from bench_parse_date import make_inputs  # noqa: E402
+
+BENCHMARKS = ("scraper_run", "scraper_run_concurrent", "parse_html", "parse_date", "process_data")
+
+DEFAULT_SIZES = "1000,10000,100000"
+DEFAULT_RUN_SIZES = "1000,10000"
+
+# 对比时耗时增加超过该比例视为性能退化
+DEFAULT_REGRESSION_THRESHOLD = 0.1
+
+
+def load(module: str):
+    return importlib.import_module(f"{PACKAGE}.{module}")
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测代码逐条输出的进度信息"""
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def timed(func: Callable[[], Any], repeat: int = 1) -> Tuple[float, Any]:
+    """运行repeat次，返回最短耗时和最后一次的结果"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with quiet():
+            result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def make_result(name: str, size: int, items: int, seconds: float, **extra) -> Dict[str, Any]:
+    result = {
+        "name": name,
+        "size": size,
+        "items": items,
+        "seconds": round(seconds, 4),
+        "items_per_second": round(items / seconds, 1) if seconds else None,
+        "us_per_item": round(seconds / items * 1e6, 2) if items else None,
+    }
+    result.update(extra)
+    return result
+
+
+def bench_scraper_run(args, size: int, concurrent: bool) -> Dict[str, Any]:
+    """完整抓取：产品列表、每个产品的详情和收益"""
+    icbc = load("scrapers.icbc_scraper")
+    metrics = load("utils.metrics").get_metrics()
+
+    bank = MockBank(size, args.page_size, args.returns_days)
+    with MockBankServer(bank, args.latency, list_api=args.list_mode == "api") as server:
+        load("utils.rate_limiter").get_rate_limiter().configure_host(
+            f"{server.host}:{server.port}", rate=args.rate, burst=args.concurrency)
+
+        spec = icbc.load_spec(icbc.ICBC_SPEC_PATH)
+        if args.list_mode == "api":
+            spec["list_api"] = LIST_API_SPEC
+
+        def run():
+            scraper = icbc.ICBCScraper(base_url=server.base_url, spec=spec)
+            if concurrent:
+                return scraper.run_concurrent(max_concurrency=args.concurrency,
+                                              per_host_concurrency=args.concurrency)
+            return scraper.run()
+
+        metrics.reset()
+        seconds, result = timed(run)
+        summary = metrics.summary()
+
+    name = "scraper_run_concurrent" if concurrent else "scraper_run"
+    return make_result(name, size, result["products_count"], seconds,
+                       returns=result["returns_count"], requests=server.requests,
+                       list_mode=args.list_mode, time_breakdown=summary["time_breakdown"])
+
+
+def bench_parse_html(args, size: int) -> List[Dict[str, Any]]:
+    """解析覆盖size个产品的列表页，每个后端分别计时"""
+    parser = load("utils.parser")
+    bank = MockBank(size, args.page_size, args.returns_days)
+    pages = [bank.list_page_html(page) for page in range(1, -(-size // args.page_size) + 1)]
+    total_bytes = sum(len(html.encode("utf-8")) for html in pages)
+
+    results = []
+    for backend in parser.PARSER_BACKENDS:
+        def parse():
+            for html in pages:
+                parser.parse_html(html, backend)
+
+        seconds, _ = timed(parse, args.repeat)
+        results.append(make_result(f"parse_html_{backend}", size, size, seconds,
+                                   pages=len(pages), bytes=total_bytes))
+    return results
+
+
+def bench_parse_date(args, size: int) -> Dict[str, Any]:
+    """解析size个产品的收益日期，日期在产品之间重复，与实际收益数据一致"""
+    date_utils = load("utils.date_utils")
+    inputs = make_inputs(size * args.returns_days, 365)
+
+    def parse():
+        date_utils._parse_date_cached.cache_clear()
+        for value in inputs:
+            date_utils.parse_date(value)
+
+    seconds, _ = timed(parse, args.repeat)
+    return make_result("parse_date", size, len(inputs), seconds)
+
+
+def make_crawl_data(bank: MockBank, size: int) -> Dict[str, Any]:
+    """构造与工商银行爬虫抓取结果结构相同的数据"""
+    fingerprint = load("utils.fingerprint").fingerprint
+    today = datetime.date.today()
+    end_date = BASE_DATE + datetime.timedelta(days=365)
+
+    products = []
+    daily_returns = []
+    for index in range(size):
+        item = bank.product(index)
+        code = item["productCode"]
+        product = {
+            "product_name": item["productName"],
+            "product_code": code,
+            "product_type": item["productType"],
+            "risk_level": item["riskLevel"],
+            "expected_return": float(item["expectedReturn"]),
+            "investment_horizon": item["investmentPeriod"],
+            "details_url": f"http://127.0.0.1{item['detailUrl']}",
+            "company_name": "模拟银行",
+            "company_url": "http://127.0.0.1",
+        }
+        product["list_hash"] = fingerprint(product)
+        product.update({
+            "min_investment": 1.0 + index % 5 * 10000,
+            "status": "在售",
+            "establishment_date": BASE_DATE + datetime.timedelta(days=index % 1000),
+            "description": f"{item['productName']}主要投资于债券、存款等固定收益类资产。",
+            "last_update": today,
+            "details_checked": today,
+        })
+        product["content_hash"] = fingerprint(product)
+        products.append(product)
+
+        for row in bank.returns_json(index, None, end_date)["data"]:
+            daily_returns.append({
+                "product_code": code,
+                "date": datetime.date.fromisoformat(row["date"]),
+                "unit_net_value": float(row["unitNetValue"]),
+                "cumulative_net_value": float(row["cumulativeNetValue"]),
+                "daily_return_rate": float(row["dailyReturn"]),
+                "seven_day_annualized": float(row["sevenDayAnnualized"]),
+            })
+
+    return {"company_name": "模拟银行", "products": products, "daily_returns": daily_returns}
+
+
+def bench_process_data(args, size: int, db_dir: str) -> Dict[str, Any]:
+    """写入空的SQLite数据库，再写入一次相同数据测量未变化时的耗时"""
+    database = load("models.database")
+    migrations = load("models.migrations")
+    data_processor = load("models.data_processor")
+
+    data = make_crawl_data(MockBank(size, args.page_size, args.returns_days), size)
+    rows = len(data["products"]) + len(data["daily_returns"])
+
+    db_path = os.path.join(db_dir, f"bench_{size}.db")
+    database.configure_database(f"sqlite:///{db_path}")
+    database.init_db()
+    migrations.migrate_db()
+
+    def process():
+        processor = data_processor.DataProcessor()
+        try:
+            return processor.process_data(data)
+        finally:
+            processor.close()
+
+    seconds, result = timed(process)
+    unchanged_seconds, unchanged = timed(process)
+    database.engine.dispose()
+
+    return make_result("process_data", size, rows, seconds,
+                       products_new=result["products_new"], returns_new=result["returns_new"],
+                       unchanged_seconds=round(unchanged_seconds, 4),
+                       products_unchanged=unchanged["products_unchanged"])
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, threshold: float) -> int:
+    """与之前的结果对比，返回性能退化的项数"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["name"], r["size"]): r for r in baseline.get("results", [])}
+
+    print(f"\n与 {baseline_path} (commit {baseline.get('commit')}) 对比:")
+    regressions = 0
+    for result in results:
+        old = previous.get((result["name"], result["size"]))
+        if not old or not old.get("seconds"):
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  <- 变慢"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  <- 变快"
+        print(f"{result['name']:<24} {result['size']:>8}  {old['seconds']:>9.3f} -> {result['seconds']:>9.3f} 秒"
+              f"  {ratio:5.2f}x{flag}")
+    return regressions
+
+
+def parse_sizes(value: str) -> List[int]:
+    return [int(size) for size in value.split(",") if size.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='爬虫吞吐量基准')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='产品数量，逗号分隔')
+    parser.add_argument('--run-sizes', default=DEFAULT_RUN_SIZES, help='完整抓取的产品数量，逗号分隔')
+    parser.add_argument('--benchmarks', default=",".join(BENCHMARKS),
+                        help=f'要运行的基准，逗号分隔，可选: {", ".join(BENCHMARKS)}')
+    parser.add_argument('--page-size', type=int, default=20, help='列表页每页产品数')
+    parser.add_argument('--returns-days', type=int, default=5, help='每个产品的收益记录数')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟网站每个请求的延迟（秒）')
+    parser.add_argument('--list-mode', choices=['api', 'html'], default='api',
+                        help='产品列表使用JSON接口还是HTML翻页')
+    parser.add_argument('--rate', type=float, default=100000.0, help='对模拟网站的限速（每秒请求数）')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发抓取的并发数')
+    parser.add_argument('--repeat', type=int, default=3, help='解析类基准的重复次数，取最短耗时')
+    parser.add_argument('--output', help='结果文件，默认写入 benchmarks/results/ 下带时间戳的文件')
+    parser.add_argument('--compare', help='对比的历史结果文件')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help='耗时增加超过该比例视为退化')
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.benchmarks.split(",") if name.strip()]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(sorted(unknown))}")
+
+    sizes = parse_sizes(args.sizes)
+    run_sizes = parse_sizes(args.run_sizes)
+    results = []
+    db_dir = tempfile.mkdtemp(prefix="bench_db_")
+
+    def record(result):
+        results.append(result)
+        print(f"{result['name']:<24} {result['size']:>8}  {result['seconds']:>9.3f} 秒  "
+              f"{result['items_per_second'] or 0:>12.1f} 条/秒")
+
+    try:
+        for name in selected:
+            for size in run_sizes if name.startswith("scraper_run") else sizes:
+                if name == "scraper_run":
+                    record(bench_scraper_run(args, size, concurrent=False))
+                elif name == "scraper_run_concurrent":
+                    record(bench_scraper_run(args, size, concurrent=True))
+                elif name == "parse_html":
+                    for result in bench_parse_html(args, size):
+                        record(result)
+                elif name == "parse_date":
+                    record(bench_parse_date(args, size))
+                elif name == "process_data":
+                    record(bench_process_data(args, size, db_dir))
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+    report = {
+        "commit": get_commit(),
+        "created_at": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"bench_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"{regressions} 项基准变慢超过 {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
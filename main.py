@@ -2,14 +2,26 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import contextlib
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from typing import List, Dict
 
-from models.database import init_db
+from models.database import init_db, configure_database
 from models.data_processor import DataProcessor
+from models.migrations import migrate_db
+from models.pipeline import stream_scraper, StreamingWriter
 from scrapers.webank_scraper import WeBankScraper
 from scrapers.icbc_scraper import ICBCScraper
+from scrapers.declarative import DeclarativeScraper, load_specs
+from utils.http_session import get_session_pool
+from utils.http_cache import configure_http_cache
+from utils.checkpoint import CheckpointStore
+from utils.rate_limiter import get_rate_limiter
+from utils.browser_pool import configure_browser_pool
+from utils.metrics import get_metrics
+from utils.profiling import profile_run, PROFILE_MODES, DEFAULT_PROFILE_DIR, DEFAULT_SAMPLE_INTERVAL
 
 
 def get_partners():
@@ -20,15 +32,82 @@ def get_partners():
 
 
 def init_scrapers():
-    """初始化所有爬虫"""
+    """初始化所有爬虫，scrapers/specs 下没有专门爬虫类的定义按声明式爬虫加载"""
     scrapers = [
         ICBCScraper(),
         # 添加更多爬虫...
     ]
+    
+    names = {scraper.company_name for scraper in scrapers}
+    for spec in load_specs():
+        if spec.get("company_name") not in names:
+            scrapers.append(DeclarativeScraper(spec))
+            names.add(spec["company_name"])
     return scrapers
 
 
-def run_specific_scraper(scraper_name: str, max_products: int = None):
+def scrape_and_save(scraper, max_products: int = None, concurrency: int = None,
+                    per_host_concurrency: int = None, incremental: bool = False,
+                    stream: bool = False, resume: bool = False, refresh_details: bool = False,
+                    profile: Dict = None, preload_ids: bool = False, max_cached_ids: int = None) -> Dict:
+    """
+    运行单个爬虫并将数据保存到数据库，指定并发数时使用并发模式，
+    流式模式下边抓取边分批写入数据库，resume为True时从上次中断的断点继续（只支持流式模式）；
+    默认跳过列表条目未变化且近期抓取过的产品详情，refresh_details为True时全部重新抓取；
+    profile为profile_run的参数，指定时对本次运行做性能分析；
+    preload_ids和max_cached_ids控制写入数据库时的产品ID索引（预加载该公司全部产品、有界索引的容量）
+    """
+    if resume and not stream:
+        raise ValueError("断点续抓只支持流式模式")
+    
+    # 记录抓取进度，以便中断后继续
+    checkpoint = CheckpointStore.for_scraper(scraper.company_name)
+    if resume and not checkpoint.load().finished:
+        print(f"从断点继续运行 {scraper.company_name} 爬虫...")
+    else:
+        checkpoint.reset()
+    scraper.checkpoint = checkpoint
+    
+    profiler = profile_run(scraper.company_name, **profile) if profile else contextlib.nullcontext()
+    index_options = {"preload_ids": preload_ids, "max_cached_ids": max_cached_ids}
+    with profiler:
+        # 流式模式下由写入线程的处理器写入，这里的处理器只用于查询，不预加载索引
+        processor = DataProcessor() if stream else DataProcessor(company_name=scraper.company_name, **index_options)
+        try:
+            # 增量模式下只抓取数据库中缺失的收益日期
+            last_return_dates = None
+            if incremental:
+                last_return_dates = processor.get_latest_return_dates(scraper.company_name)
+            
+            if not refresh_details:
+                scraper.known_products = processor.get_known_products(scraper.company_name)
+            
+            if stream:
+                writer = StreamingWriter(scraper.company_name, checkpoint=checkpoint, **index_options)
+                results = stream_scraper(scraper, max_products, concurrency, per_host_concurrency,
+                                         last_return_dates=last_return_dates, writer=writer)
+            else:
+                if concurrency or per_host_concurrency:
+                    data = scraper.run_concurrent(max_products, concurrency, per_host_concurrency,
+                                                  last_return_dates=last_return_dates)
+                else:
+                    data = scraper.run(max_products, last_return_dates=last_return_dates)
+                
+                # 保存数据到数据库
+                results = processor.process_data(data)
+                results["id_index"] = processor.product_ids.stats()
+            
+            # 流式模式下有抓取失败的阶段时保留断点，可用--resume只重新获取失败的部分
+            if results.get("failed_count"):
+                print(f"{scraper.company_name} 有 {results['failed_count']} 个抓取阶段失败，可使用 --resume 重试")
+            else:
+                checkpoint.mark_finished()
+            return results
+        finally:
+            processor.close()
+
+
+def run_specific_scraper(scraper_name: str, **options):
     """运行指定名称的爬虫"""
     scrapers = init_scrapers()
     found = False
@@ -36,14 +115,10 @@ def run_specific_scraper(scraper_name: str, max_products: int = None):
     for scraper in scrapers:
         if scraper.company_name == scraper_name:
             print(f"开始运行 {scraper_name} 爬虫...")
-            data = scraper.run(max_products)
-            
-            # 保存数据到数据库
-            processor = DataProcessor()
-            results = processor.process_data(data)
-            processor.close()
+            results = scrape_and_save(scraper, **options)
             
             print_results(results)
+            print_pool_stats()
             found = True
             break
     
@@ -51,26 +126,71 @@ def run_specific_scraper(scraper_name: str, max_products: int = None):
         print(f"未找到名为 {scraper_name} 的爬虫")
 
 
-def run_all_scrapers(max_products: int = None):
-    """运行所有爬虫"""
+def _run_scraper_job(index: int, options: Dict, collect_metrics: bool = False) -> Dict:
+    """
+    在工作进程或线程中运行第index个爬虫
+    collect_metrics为True时（进程池模式）把子进程的指标随结果返回，由主进程合并
+    """
+    scraper = init_scrapers()[index]
+    print(f"开始运行 {scraper.company_name} 爬虫...")
+    if collect_metrics:
+        get_metrics().reset()
+    results = scrape_and_save(scraper, **options)
+    if collect_metrics:
+        results["metrics"] = get_metrics().snapshot()
+    return results
+
+
+def run_all_scrapers(workers: int = 1, executor: str = 'process', settings: Dict = None, **options):
+    """
+    运行所有爬虫
+    workers大于1时不同公司的爬虫在进程池或线程池中并行运行，
+    各自访问不同主机，互不占用限速配额
+    """
     scrapers = init_scrapers()
     all_results = []
     
-    for scraper in scrapers:
-        print(f"开始运行 {scraper.company_name} 爬虫...")
-        data = scraper.run(max_products)
-        
-        # 保存数据到数据库
-        processor = DataProcessor()
-        results = processor.process_data(data)
-        processor.close()
+    if workers <= 1 or len(scrapers) <= 1:
+        for scraper in scrapers:
+            print(f"开始运行 {scraper.company_name} 爬虫...")
+            results = scrape_and_save(scraper, **options)
+            all_results.append(results)
+    else:
+        workers = min(workers, len(scrapers))
+        if executor == 'process':
+            # 子进程不继承运行时配置，启动时重新应用
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=apply_settings,
+                                       initargs=(settings or {},))
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers)
         
-        all_results.append(results)
+        with pool:
+            futures = [pool.submit(_run_scraper_job, i, options, executor == 'process')
+                       for i in range(len(scrapers))]
+            # 按爬虫顺序汇总结果，单个爬虫失败不影响其他爬虫
+            for scraper, future in zip(scrapers, futures):
+                try:
+                    results = future.result()
+                    if "metrics" in results:
+                        get_metrics().merge(results.pop("metrics"))
+                    all_results.append(results)
+                except Exception as e:
+                    print(f"{scraper.company_name} 爬虫运行失败: {str(e)}")
     
     # 打印总结果
     print("\n所有爬虫运行完成，总结:")
     for result in all_results:
         print_results(result)
+    # 进程池模式下连接池统计在子进程中，主进程无法汇总
+    if workers <= 1 or executor != 'process':
+        print_pool_stats()
+
+
+def print_pool_stats():
+    """打印HTTP连接池统计信息"""
+    stats = get_session_pool().stats()
+    print(f"\nHTTP连接池: 请求 {stats['requests']} 次，新建连接 {stats['connections_created']} 个，"
+          f"复用率 {stats['reuse_ratio']:.1%}，当前打开连接 {stats['open_connections']} 个")
 
 
 def print_results(results: Dict):
@@ -79,8 +199,61 @@ def print_results(results: Dict):
     print(f"  产品总数: {results['products_count']}")
     print(f"  新增产品: {results['products_new']}")
     print(f"  更新产品: {results['products_updated']}")
+    print(f"  未变化产品: {results.get('products_unchanged', 0)}")
     print(f"  收益记录总数: {results['returns_count']}")
     print(f"  新增收益记录: {results['returns_new']}")
+    if results.get("id_index"):
+        index = results["id_index"]
+        print(f"  产品ID索引: {index['size']} 个产品，命中 {index['hits']} 次，未命中 {index['misses']} 次")
+
+
+def write_metrics(metrics_file: str = None, metrics_json: str = None):
+    """写出Prometheus textfile和本次运行的汇总JSON"""
+    metrics = get_metrics()
+    if metrics_file:
+        metrics.write_textfile(metrics_file)
+        print(f"指标已写入 {metrics_file}")
+    if metrics_json:
+        metrics.write_summary(metrics_json, {"argv": sys.argv[1:]})
+        print(f"运行汇总已写入 {metrics_json}")
+    
+    breakdown = metrics.summary()["time_breakdown"]
+    print(f"\n耗时分布: 请求 {breakdown['http_request_seconds']:.1f} 秒，限速等待 {breakdown['rate_limit_wait_seconds']:.1f} 秒，"
+          f"解析 {breakdown['parse_seconds']:.1f} 秒，数据库写入 {breakdown['db_write_seconds']:.1f} 秒")
+    stages = metrics.get_stage_seconds()
+    if stages:
+        print("各阶段累计耗时: " + "，".join(f"{name} {seconds:.1f} 秒" for name, seconds in sorted(stages.items())))
+
+
+def apply_settings(settings: Dict):
+    """应用数据库、HTTP连接池、限速和缓存等运行时配置"""
+    # 切换数据库
+    if settings.get("db_url"):
+        configure_database(settings["db_url"])
+    
+    # 调整HTTP连接池大小
+    if settings.get("pool_size"):
+        get_session_pool().configure(pool_maxsize=settings["pool_size"])
+    
+    # 调整请求速率
+    if settings.get("rate") or settings.get("max_rate") or settings.get("burst"):
+        get_rate_limiter().configure(rate=settings.get("rate"), burst=settings.get("burst"),
+                                     max_rate=settings.get("max_rate"))
+    
+    # 启用HTTP缓存
+    if settings.get("http_cache") or settings.get("offline"):
+        configure_http_cache(settings.get("http_cache") or '.http_cache',
+                             max_bytes=settings.get("cache_max_mb", 512) * 1024 * 1024,
+                             offline=settings.get("offline", False))
+    
+    # 调整无头浏览器池
+    if settings.get("browser_pool_size") or settings.get("browser_recycle"):
+        browser_options = {}
+        if settings.get("browser_pool_size"):
+            browser_options["size"] = settings["browser_pool_size"]
+        if settings.get("browser_recycle"):
+            browser_options["recycle_after"] = settings["browser_recycle"]
+        configure_browser_pool(**browser_options)
 
 
 def main():
@@ -91,9 +264,65 @@ def main():
     parser.add_argument('--all', action='store_true', help='抓取所有已实现爬虫的理财公司数据')
     parser.add_argument('--max-products', type=int, help='每个公司最多抓取的产品数量')
     parser.add_argument('--init-db', action='store_true', help='初始化数据库')
+    parser.add_argument('--migrate-db', action='store_true', help='迁移已有数据库的表结构和索引')
+    parser.add_argument('--rebuild-summary', action='store_true', help='全量重建产品汇总表')
+    parser.add_argument('--export-parquet', metavar='DIR', help='把产品和收益数据导出为按公司和月份分区的Parquet文件')
+    parser.add_argument('--full-export', action='store_true', help='配合--export-parquet，重新导出全部收益数据而不是只追加新增记录；已导出的收益记录被更新后需使用')
+    parser.add_argument('--rank', type=int, metavar='N', help='按指标输出排名前N的产品，可配合--company过滤')
+    parser.add_argument('--rank-by', default='sharpe_ratio',
+                        choices=['sharpe_ratio', 'annualized_return', 'volatility', 'max_drawdown', 'seven_day_annualized'],
+                        help='排名使用的指标')
+    parser.add_argument('--rank-order', choices=['asc', 'desc'],
+                        help='排名方向，默认按指标：波动率从低到高，其余指标从高到低')
+    parser.add_argument('--db-url', help='数据库地址，如 sqlite:///financial_products.db 或 postgresql://...，默认读取环境变量DATABASE_URL')
+    parser.add_argument('--workers', type=int, default=1, help='--all模式下并行运行的爬虫数量')
+    parser.add_argument('--executor', choices=['process', 'thread'], default='process',
+                        help='并行运行爬虫使用进程池还是线程池')
+    parser.add_argument('--concurrency', type=int, help='并发抓取模式的全局并发数')
+    parser.add_argument('--per-host-concurrency', type=int, help='并发抓取模式的单主机并发数')
+    parser.add_argument('--pool-size', type=int, help='每个主机HTTP连接池的最大连接数')
+    parser.add_argument('--rate', type=float, help='每个主机的初始请求速率(次/秒)，遇到限流时自动降低')
+    parser.add_argument('--max-rate', type=float, help='每个主机自适应提速的速率上限(次/秒)')
+    parser.add_argument('--burst', type=int, help='每个主机允许的突发请求数')
+    parser.add_argument('--incremental', action='store_true', help='增量抓取，只获取数据库中缺失日期的收益数据')
+    parser.add_argument('--stream', action='store_true', help='流式模式，边抓取边分批写入数据库')
+    parser.add_argument('--refresh-details', action='store_true', help='重新抓取所有产品详情，不跳过未变化的产品')
+    parser.add_argument('--resume', action='store_true', help='从上次中断的断点继续抓取，跳过已保存的产品，需配合--stream使用')
+    parser.add_argument('--preload-ids', action='store_true', help='写入前一次加载该公司全部产品的ID，产品较多时减少查询次数')
+    parser.add_argument('--max-cached-ids', type=int, help='产品ID索引最多保留的产品数量，超过时淘汰最久未使用的产品')
+    parser.add_argument('--http-cache', help='HTTP缓存目录，指定后启用页面缓存')
+    parser.add_argument('--cache-max-mb', type=int, default=512, help='HTTP缓存目录的大小上限(MB)')
+    parser.add_argument('--browser-pool-size', type=int, help='渲染JavaScript页面的无头浏览器数量')
+    parser.add_argument('--browser-recycle', type=int, help='每个无头浏览器加载多少个页面后重启')
+    parser.add_argument('--metrics-file', help='运行结束后写入Prometheus textfile格式的指标文件')
+    parser.add_argument('--metrics-json', help='运行结束后写入本次运行的汇总JSON')
+    parser.add_argument('--metrics-port', type=int, help='运行期间在该端口提供 /metrics 接口')
+    parser.add_argument('--profile', nargs='?', const='sample', choices=PROFILE_MODES,
+                        help='对每个爬虫的运行做性能分析，sample为采样分析（默认），cprofile另外运行cProfile')
+    parser.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, help='性能分析结果（折叠栈和.prof文件）的目录')
+    parser.add_argument('--profile-interval', type=float, default=DEFAULT_SAMPLE_INTERVAL, help='采样间隔（秒）')
+    parser.add_argument('--offline', action='store_true', help='离线模式，只从HTTP缓存回放页面，不访问网络')
     
     args = parser.parse_args()
     
+    # 只有流式模式会逐批记录产品的完成情况，非流式模式中断时数据尚未写入，无法从断点继续
+    if args.resume and not args.stream:
+        parser.error("--resume 需要配合 --stream 使用")
+    
+    settings = {
+        "db_url": args.db_url,
+        "pool_size": args.pool_size,
+        "rate": args.rate,
+        "max_rate": args.max_rate,
+        "burst": args.burst,
+        "http_cache": args.http_cache,
+        "cache_max_mb": args.cache_max_mb,
+        "offline": args.offline,
+        "browser_pool_size": args.browser_pool_size,
+        "browser_recycle": args.browser_recycle,
+    }
+    apply_settings(settings)
+    
     # 初始化数据库
     if args.init_db:
         print("正在初始化数据库...")
@@ -101,6 +330,42 @@ def main():
         print("数据库初始化完成")
         return
     
+    # 迁移数据库结构
+    if args.migrate_db:
+        print("正在迁移数据库...")
+        migrate_db()
+        print("数据库迁移完成")
+        return
+    
+    # 重建产品汇总表
+    if args.rebuild_summary:
+        from models.summary import rebuild_product_summaries
+        print("正在重建产品汇总表...")
+        processor = DataProcessor()
+        try:
+            count = rebuild_product_summaries(processor.db)
+        finally:
+            processor.close()
+        print(f"产品汇总表重建完成，共 {count} 个产品")
+        return
+    
+    # 导出Parquet文件
+    if args.export_parquet:
+        from models.parquet_export import ParquetExporter
+        print(f"正在导出数据到 {args.export_parquet} ...")
+        counts = ParquetExporter(args.export_parquet).export(incremental=not args.full_export)
+        print(f"导出完成: 产品 {counts['products']} 个，新增收益记录 {counts['daily_returns']} 条")
+        return
+    
+    # 产品指标排名
+    if args.rank:
+        from models import analytics
+        nav = analytics.load_nav_matrix(company_name=args.company)
+        ascending = {'asc': True, 'desc': False}.get(args.rank_order)
+        ranked = analytics.rank_products(analytics.summarize(nav), by=args.rank_by, ascending=ascending, top=args.rank)
+        print(ranked.to_string())
+        return
+    
     # 列出合作伙伴
     if args.list_partners:
         partners = get_partners()
@@ -109,14 +374,40 @@ def main():
             print(f"{i+1}. {partner['name']} - {partner['url']}")
         return
     
+    crawl_options = {
+        "max_products": args.max_products,
+        "concurrency": args.concurrency,
+        "per_host_concurrency": args.per_host_concurrency,
+        "incremental": args.incremental,
+        "stream": args.stream,
+        "resume": args.resume,
+        "refresh_details": args.refresh_details,
+        "preload_ids": args.preload_ids,
+        "max_cached_ids": args.max_cached_ids,
+        "profile": {
+            "mode": args.profile,
+            "output_dir": args.profile_dir,
+            "interval": args.profile_interval,
+        } if args.profile else None,
+    }
+    
+    if args.profile and args.all and args.workers > 1 and args.executor == 'thread':
+        print("注意: 线程池模式下多个爬虫同时运行，各爬虫的折叠栈会包含其他爬虫线程的采样")
+    
+    if args.metrics_port:
+        get_metrics().start_http_exporter(args.metrics_port)
+        print(f"指标接口: http://localhost:{args.metrics_port}/metrics")
+    
     # 运行指定公司爬虫
     if args.company:
-        run_specific_scraper(args.company, args.max_products)
+        run_specific_scraper(args.company, **crawl_options)
+        write_metrics(args.metrics_file, args.metrics_json)
         return
     
     # 运行所有爬虫
     if args.all:
-        run_all_scrapers(args.max_products)
+        run_all_scrapers(args.workers, args.executor, settings, **crawl_options)
+        write_metrics(args.metrics_file, args.metrics_json)
         return
     
     # 如果没有指定任何操作，显示帮助信息
@@ -0,0 +1,181 @@
+import datetime
+import warnings
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from . import database
+
+# 年化天数，理财产品净值按自然日披露
+ANNUALIZATION_DAYS = 365
+
+# 滚动指标的默认窗口（天）
+DEFAULT_WINDOW = 30
+
+NAV_COLUMNS = ("unit_net_value", "cumulative_net_value")
+
+# 越低越好的指标，排名默认升序
+LOWER_IS_BETTER = ("volatility",)
+
+
+def load_nav_matrix(value: str = "unit_net_value", start_date: Optional[datetime.date] = None,
+                    end_date: Optional[datetime.date] = None, company_name: Optional[str] = None,
+                    product_ids: Optional[List[int]] = None, engine=None) -> pd.DataFrame:
+    """
+    从数据库读取净值，返回以日期为行、产品ID为列的矩阵
+    缺失的日期按前一日净值填充
+    """
+    if value not in NAV_COLUMNS:
+        raise ValueError(f"不支持的净值字段: {value}")
+
+    conditions = [f"r.{value} IS NOT NULL"]
+    params = {}
+    if start_date:
+        conditions.append("r.date >= :start_date")
+        params["start_date"] = start_date
+    if end_date:
+        conditions.append("r.date <= :end_date")
+        params["end_date"] = end_date
+    if company_name:
+        conditions.append("p.company_name = :company_name")
+        params["company_name"] = company_name
+    if product_ids:
+        conditions.append(f"r.product_id IN ({', '.join(str(int(i)) for i in product_ids)})")
+
+    query = f"""
+        SELECT r.product_id, r.date, r.{value} AS nav
+        FROM daily_returns r
+        JOIN products p ON p.id = r.product_id
+        WHERE {' AND '.join(conditions)}
+    """
+    df = pd.read_sql_query(text(query), engine or database.engine, params=params, parse_dates=["date"])
+    return to_nav_matrix(df)
+
+
+def load_nav_matrix_from_parquet(output_dir: str, value: str = "unit_net_value",
+                                 filters: Optional[List] = None) -> pd.DataFrame:
+    """从导出的Parquet文件读取净值矩阵，不访问抓取数据库"""
+    from .parquet_export import read_returns
+
+    table = read_returns(output_dir, columns=["product_id", "date", value], filters=filters)
+    df = table.to_pandas().rename(columns={value: "nav"})
+    df["date"] = pd.to_datetime(df["date"])
+    return to_nav_matrix(df.dropna(subset=["nav"]))
+
+
+def to_nav_matrix(df: pd.DataFrame) -> pd.DataFrame:
+    """把(product_id, date, nav)长表转换为按自然日对齐的净值矩阵"""
+    if df.empty:
+        return pd.DataFrame(dtype=float)
+
+    nav = df.pivot_table(index="date", columns="product_id", values="nav", aggfunc="last")
+    nav = nav.asfreq("D").ffill()
+    # 净值必须为正，否则收益率计算无意义
+    return nav.where(nav > 0)
+
+
+def period_returns(nav: pd.DataFrame) -> pd.DataFrame:
+    """每日收益率矩阵"""
+    return nav.pct_change(fill_method=None)
+
+
+def rolling_annualized_return(nav: pd.DataFrame, window: int = DEFAULT_WINDOW) -> pd.DataFrame:
+    """滚动窗口的年化收益率"""
+    return (nav / nav.shift(window)) ** (ANNUALIZATION_DAYS / window) - 1
+
+
+def rolling_volatility(nav: pd.DataFrame, window: int = DEFAULT_WINDOW) -> pd.DataFrame:
+    """滚动窗口的年化波动率"""
+    return period_returns(nav).rolling(window, min_periods=max(2, window // 2)).std() * np.sqrt(ANNUALIZATION_DAYS)
+
+
+def seven_day_annualized(nav: pd.DataFrame) -> pd.DataFrame:
+    """由净值重新计算7日年化收益率(%)"""
+    return ((nav / nav.shift(7)) ** (ANNUALIZATION_DAYS / 7) - 1) * 100
+
+
+def max_drawdown(nav: pd.DataFrame) -> pd.Series:
+    """每个产品在整个区间内的最大回撤（负数）"""
+    return (nav / nav.cummax() - 1).min()
+
+
+def annualized_return(nav: pd.DataFrame) -> pd.Series:
+    """每个产品从首个净值到最新净值的年化收益率"""
+    first_nav = nav.bfill().iloc[0] if len(nav) else pd.Series(dtype=float)
+    last_nav = nav.ffill().iloc[-1] if len(nav) else pd.Series(dtype=float)
+    days = nav.notna().sum() - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (last_nav / first_nav) ** (ANNUALIZATION_DAYS / days.where(days > 0)) - 1
+
+
+def sharpe_ratio(nav: pd.DataFrame, risk_free_rate: float = 0.0) -> pd.Series:
+    """年化夏普比率，risk_free_rate为年化无风险利率（如0.02表示2%）"""
+    returns = period_returns(nav)
+    mean = returns.mean() * ANNUALIZATION_DAYS
+    std = returns.std() * np.sqrt(ANNUALIZATION_DAYS)
+    return (mean - risk_free_rate) / std.where(std > 0)
+
+
+def summarize(nav: pd.DataFrame, window: int = DEFAULT_WINDOW, risk_free_rate: float = 0.0) -> pd.DataFrame:
+    """
+    计算所有产品的指标汇总
+    返回以产品ID为索引的表，包含最新净值、区间年化收益、滚动年化收益、波动率、最大回撤、夏普比率和7日年化；
+    滚动指标与rolling_*函数使用同一实现，只在末尾窗口上计算最新值，其余为整列的NumPy运算
+    """
+    if nav.empty:
+        return pd.DataFrame()
+
+    values = nav.ffill().to_numpy(dtype=float)
+    rows, columns = values.shape
+    first_index = (~np.isnan(values)).argmax(axis=0)
+    first = values[first_index, np.arange(columns)]
+    latest = values[-1]
+
+    # 滚动指标只需要最新一行，只取末尾窗口交给rolling_*函数
+    filled = nav.ffill()
+    tail = filled.iloc[-(window + 1):]
+
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        # 全为空的产品会触发空切片警告，结果为NaN即可
+        warnings.simplefilter("ignore", RuntimeWarning)
+
+        held_days = (rows - 1 - first_index).astype(float)
+        held_days[held_days <= 0] = np.nan
+
+        returns = values[1:] / values[:-1] - 1
+        volatility = np.nanstd(returns, axis=0, ddof=1) * np.sqrt(ANNUALIZATION_DAYS)
+        volatility[volatility <= 0] = np.nan
+        mean_return = np.nanmean(returns, axis=0) * ANNUALIZATION_DAYS
+
+        summary = pd.DataFrame({
+            "latest_nav": latest,
+            "annualized_return": (latest / first) ** (ANNUALIZATION_DAYS / held_days) - 1,
+            f"rolling_{window}d_return": rolling_annualized_return(tail, window).iloc[-1].to_numpy(),
+            "volatility": volatility,
+            f"rolling_{window}d_volatility": rolling_volatility(tail, window).iloc[-1].to_numpy(),
+            "max_drawdown": np.nanmin(values / np.fmax.accumulate(values, axis=0) - 1, axis=0),
+            "sharpe_ratio": (mean_return - risk_free_rate) / volatility,
+            "seven_day_annualized": seven_day_annualized(filled.iloc[-8:]).iloc[-1].to_numpy(),
+        }, index=nav.columns)
+
+    return summary
+
+
+def is_lower_better(metric: str) -> bool:
+    """指标是否越低越好"""
+    return metric in LOWER_IS_BETTER or metric.endswith("_volatility")
+
+
+def rank_products(summary: pd.DataFrame, by: str = "sharpe_ratio", ascending: Optional[bool] = None,
+                  top: Optional[int] = None) -> pd.DataFrame:
+    """
+    按指定指标对产品排名
+    ascending为None时按指标的默认方向：波动率越低越靠前，其余指标越高越靠前（最大回撤为负数，越接近0越好）
+    """
+    if ascending is None:
+        ascending = is_lower_better(by)
+    ranked = summary.sort_values(by, ascending=ascending, na_position="last")
+    ranked.insert(0, "rank", np.arange(1, len(ranked) + 1))
+    return ranked.head(top) if top else ranked
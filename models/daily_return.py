@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, Date, String, ForeignKey
+from sqlalchemy import Column, Integer, Float, Date, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -6,10 +6,17 @@ from .database import Base
 class DailyReturn(Base):
     """理财产品每日收益模型"""
     __tablename__ = "daily_returns"
+    __table_args__ = (
+        # 同一产品同一日期只有一条收益记录，按产品查询日期范围和写入时的冲突检测都走这个索引
+        Index("uq_daily_returns_product_date", "product_id", "date", unique=True),
+        # 覆盖"某产品最近N天净值"的查询，无需回表
+        Index("ix_daily_returns_product_date_values", "product_id", "date", "unit_net_value",
+              "cumulative_net_value", "daily_return_rate", "seven_day_annualized"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"), index=True)
-    product_code = Column(String(50), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    product_code = Column(String(50))
     date = Column(Date, index=True, comment="收益日期")
     unit_net_value = Column(Float, comment="单位净值")
     cumulative_net_value = Column(Float, comment="累计净值")
@@ -20,4 +27,4 @@ class DailyReturn(Base):
     product = relationship("Product", back_populates="daily_returns")
     
     def __repr__(self):
-        return f"<DailyReturn {self.product_code}: {self.date} - {self.daily_return_rate}%>"
\ No newline at end of file
+        return f"<DailyReturn {self.product_code}: {self.date} - {self.daily_return_rate}%>"
@@ -1,55 +1,420 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Optional, Tuple
 import datetime
 
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from sqlalchemy import and_, func
 
 from .database import get_db
 from .product import Product
 from .daily_return import DailyReturn
+from .summary import update_product_summaries
+from .identity_index import create_product_id_index
+from .migrations import PRODUCT_ADDED_COLUMNS
 from ..utils.date_utils import parse_date, get_today
+from ..utils import metrics as m
+from ..utils.profiling import stage, STAGE_PERSIST
+
+# 批量写入时每个事务处理的记录数
+BATCH_SIZE = 1000
+
+# IN查询每次携带的参数个数，避免超过SQLite的变量数上限
+IN_CLAUSE_CHUNK = 500
+
+# 产品表中的日期字段
+PRODUCT_DATE_FIELDS = ["establishment_date", "maturity_date", "last_update", "details_checked"]
+
+# 收益表中可写入的字段
+RETURN_COLUMNS = [column.name for column in DailyReturn.__table__.columns if column.name != "id"]
+
+
+def chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    """按固定大小切分列表"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
 
 
 class DataProcessor:
     """数据处理器，负责将爬取的数据保存到数据库"""
     
-    def __init__(self):
+    def __init__(self, preload_ids: bool = False, max_cached_ids: int = None, company_name: str = None):
         self.db = get_db()
+        # 产品代码到ID的索引，在本处理器的整个写入过程中共享；
+        # preload_ids为True时一次加载全部产品（指定company_name时只加载该公司），max_cached_ids限制索引大小
+        self.product_ids = create_product_id_index(self.db, company_name, preload=preload_ids,
+                                                   max_size=max_cached_ids)
+        self._upsert_supported = True
+        # 产品表尚未迁移、没有指纹字段时关闭指纹比对，产品全部按普通方式写入
+        self._fingerprints_supported = True
+        # 写入收益数据后增量刷新受影响产品的汇总行
+        self.maintain_summary = True
     
-    def process_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """处理爬虫抓取的数据"""
+    def process_data(self, data: Dict[str, Any], batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+        """处理爬虫抓取的数据，按批次批量写入数据库"""
         results = {
             "company_name": data.get("company_name", ""),
             "products_count": 0,
             "products_updated": 0,
             "products_new": 0,
+            "products_unchanged": 0,
             "returns_count": 0,
             "returns_new": 0
         }
         
-        # 处理产品数据
-        if "products" in data and data["products"]:
-            products_count = len(data["products"])
-            results["products_count"] = products_count
+        with stage(STAGE_PERSIST, company=results["company_name"]):
+            # 处理产品数据
+            if "products" in data and data["products"]:
+                results["products_count"] = len(data["products"])
+                
+                products_result = self.bulk_save_products(data["products"], batch_size)
+                results["products_new"] += products_result["new"]
+                results["products_updated"] += products_result["updated"]
+                results["products_unchanged"] += products_result["unchanged"]
+            
+            # 处理收益数据
+            if "daily_returns" in data and data["daily_returns"]:
+                results["returns_count"] = len(data["daily_returns"])
+                
+                returns_result = self.bulk_save_daily_returns(data["daily_returns"], batch_size)
+                results["returns_new"] += returns_result["new"]
+        
+        return results
+    
+    def bulk_save_products(self, products_data: List[Dict[str, Any]], batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+        """
+        批量保存产品数据
+        每批先用一次查询取得已有产品的ID和内容指纹，再批量插入新产品、批量更新已变化的产品，每批一个事务；
+        内容指纹未变的产品只更新详情抓取日期，列表指纹未变且未抓取详情的产品不写入
+        """
+        result = {"new": 0, "updated": 0, "unchanged": 0}
+        today = get_today()
+        
+        for batch in chunked(products_data, batch_size):
+            rows = {}
+            for product_data in batch:
+                # 检查必要字段
+                if "product_code" not in product_data or not product_data["product_code"]:
+                    print("产品数据缺少产品代码，无法保存")
+                    continue
+                
+                code = product_data["product_code"]
+                row = rows.get(code)
+                if row is None:
+                    row = rows[code] = {}
+                else:
+                    # 同一批次中重复的产品按更新计数
+                    result["updated"] += 1
+                row.update(self._clean_product_row(product_data))
+            
+            if not rows:
+                continue
             
-            for product_data in data["products"]:
-                product_result = self.save_product(product_data)
-                if product_result["is_new"]:
-                    results["products_new"] += 1
+            existing = self.get_product_fingerprints(list(rows.keys()))
+            if not self._fingerprints_supported:
+                for row in rows.values():
+                    for column in PRODUCT_ADDED_COLUMNS:
+                        row.pop(column, None)
+            self.product_ids.update({code: fingerprint[0] for code, fingerprint in existing.items()})
+            
+            inserts = []
+            updates = []
+            touches = []
+            for code, row in rows.items():
+                if code in existing:
+                    product_id, list_hash, content_hash = existing[code]
+                    if row.get("content_hash") and row["content_hash"] == content_hash:
+                        # 内容未变化，只记录本次抓取过详情
+                        if row.get("details_checked"):
+                            touches.append({"id": product_id, "details_checked": row["details_checked"]})
+                        result["unchanged"] += 1
+                        continue
+                    if not row.get("content_hash") and row.get("list_hash") and row["list_hash"] == list_hash:
+                        result["unchanged"] += 1
+                        continue
+                    
+                    row["id"] = product_id
+                    # 设置最后更新日期
+                    row["last_update"] = today
+                    updates.append(row)
                 else:
-                    results["products_updated"] += 1
+                    row.setdefault("last_update", today)
+                    inserts.append(row)
+            
+            try:
+                with m.get_metrics().timer(m.DB_WRITE_SECONDS, table=Product.__tablename__):
+                    if inserts:
+                        self.db.bulk_insert_mappings(Product, inserts)
+                    if updates:
+                        self.db.bulk_update_mappings(Product, updates)
+                    if touches:
+                        self.db.bulk_update_mappings(Product, touches)
+                    self.db.commit()
+                # 新插入产品的ID一次查询后加入索引，之后写入收益数据时直接命中
+                if inserts:
+                    self.product_ids.load([row["product_code"] for row in inserts])
+                m.get_metrics().inc(m.DB_ROWS, len(inserts) + len(updates) + len(touches), table=Product.__tablename__)
+                result["new"] += len(inserts)
+                result["updated"] += len(updates)
+            except IntegrityError as e:
+                self.db.rollback()
+                print(f"批量保存产品时发生错误，改为逐条保存: {str(e)}")
+                for product_data in batch:
+                    product_result = self.save_product(product_data)
+                    if product_result["is_new"]:
+                        result["new"] += 1
+                    elif product_result["id"]:
+                        result["updated"] += 1
+        
+        return result
+    
+    def bulk_save_daily_returns(self, returns_data: List[Dict[str, Any]], batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+        """
+        批量保存每日收益数据
+        产品代码到ID的映射一次查出，每批用一次查询找出已有记录，再批量插入和更新，每批一个事务；
+        全部写入后按各产品新插入的记录数和写入的最晚日期增量更新汇总行
+        """
+        result = {"new": 0, "updated": 0}
+        # 产品ID到 {"inserted": 新插入记录数, "max_date": 写入的最晚日期}，None表示写入情况未知
+        summary_changes: Dict[int, Optional[Dict[str, Any]]] = {}
         
-        # 处理收益数据
-        if "daily_returns" in data and data["daily_returns"]:
-            returns_count = len(data["daily_returns"])
-            results["returns_count"] = returns_count
+        # 一次性解析所有产品代码对应的产品ID
+        codes = {r["product_code"] for r in returns_data if r.get("product_code")}
+        product_ids = self.get_product_ids(list(codes))
+        
+        for code in codes - set(product_ids):
+            print(f"找不到产品代码 {code} 对应的产品，无法保存收益数据")
+        
+        for batch in chunked(returns_data, batch_size):
+            rows = {}
+            for return_data in batch:
+                # 检查必要字段
+                if "product_code" not in return_data or not return_data["product_code"]:
+                    print("收益数据缺少产品代码，无法保存")
+                    continue
+                
+                if "date" not in return_data or not return_data["date"]:
+                    print("收益数据缺少日期，无法保存")
+                    continue
+                
+                product_id = product_ids.get(return_data["product_code"])
+                if not product_id:
+                    continue
+                
+                row = {key: value for key, value in return_data.items() if key != "id" and value is not None}
+                
+                # 将字符串日期转换为日期对象
+                if isinstance(row["date"], str):
+                    row["date"] = parse_date(row["date"])
+                    if not row["date"]:
+                        continue
+                
+                row["product_id"] = product_id
+                rows.setdefault((product_id, row["date"]), {}).update(row)
+            
+            if not rows:
+                continue
+            
+            existing_ids = self._get_daily_return_ids(rows.keys())
+            new_count = len(rows) - len(existing_ids)
             
-            for return_data in data["daily_returns"]:
-                return_result = self.save_daily_return(return_data)
-                if return_result["is_new"]:
-                    results["returns_new"] += 1
+            try:
+                with m.get_metrics().timer(m.DB_WRITE_SECONDS, table=DailyReturn.__tablename__):
+                    if not self._upsert_daily_returns(list(rows.values())):
+                        inserts = []
+                        updates = []
+                        for key, row in rows.items():
+                            if key in existing_ids:
+                                row["id"] = existing_ids[key]
+                                updates.append(row)
+                            else:
+                                inserts.append(row)
+                        
+                        if inserts:
+                            self.db.bulk_insert_mappings(DailyReturn, inserts)
+                        if updates:
+                            self.db.bulk_update_mappings(DailyReturn, updates)
+                    self.db.commit()
+                m.get_metrics().inc(m.DB_ROWS, len(rows), table=DailyReturn.__tablename__)
+                for product_id, date in rows:
+                    change = summary_changes.setdefault(product_id, {"inserted": 0, "max_date": date})
+                    if change is None:
+                        continue
+                    change["max_date"] = max(change["max_date"], date)
+                    if (product_id, date) not in existing_ids:
+                        change["inserted"] += 1
+                result["new"] += new_count
+                result["updated"] += len(rows) - new_count
+            except IntegrityError as e:
+                self.db.rollback()
+                print(f"批量保存收益数据时发生错误，改为逐条保存: {str(e)}")
+                for product_id, _ in rows:
+                    summary_changes[product_id] = None
+                for return_data in batch:
+                    return_result = self.save_daily_return(dict(return_data))
+                    if return_result["is_new"]:
+                        result["new"] += 1
+                    elif return_result["id"]:
+                        result["updated"] += 1
         
-        return results
+        if summary_changes:
+            self.refresh_summaries(summary_changes)
+        
+        return result
+    
+    def refresh_summaries(self, changes: Dict[int, Optional[Dict[str, Any]]]) -> int:
+        """按本次写入的收益记录更新产品汇总表，汇总表尚未创建时关闭增量维护"""
+        if not self.maintain_summary:
+            return 0
+        
+        try:
+            with m.get_metrics().timer(m.DB_WRITE_SECONDS, table="product_summaries"):
+                return update_product_summaries(self.db, changes)
+        except (OperationalError, ProgrammingError) as e:
+            self.db.rollback()
+            print(f"无法刷新产品汇总表，请执行数据库迁移: {str(e).splitlines()[0]}")
+            self.maintain_summary = False
+            return 0
+    
+    def _upsert_daily_returns(self, rows: List[Dict[str, Any]]) -> bool:
+        """
+        用INSERT ... ON CONFLICT一次写入一批收益记录，依赖(product_id, date)唯一索引
+        数据库不支持或尚未迁移时返回False，由调用方改用普通的批量插入和更新
+        """
+        if not self._upsert_supported:
+            return False
+        
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            self._upsert_supported = False
+            return False
+        
+        # executemany要求每行的字段相同，缺失的字段补None，更新时保留原值
+        params = [{column: row.get(column) for column in RETURN_COLUMNS} for row in rows]
+        stmt = insert(DailyReturn.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["product_id", "date"],
+            set_={
+                column: func.coalesce(getattr(stmt.excluded, column), getattr(DailyReturn.__table__.c, column))
+                for column in RETURN_COLUMNS if column not in ("product_id", "date")
+            }
+        )
+        
+        try:
+            self.db.execute(stmt, params)
+        except (OperationalError, ProgrammingError) as e:
+            # 没有唯一索引时ON CONFLICT会报错，需先执行数据库迁移；本批之前的数据都已提交
+            self.db.rollback()
+            print(f"收益数据无法使用ON CONFLICT写入，请执行数据库迁移: {str(e).splitlines()[0]}")
+            self._upsert_supported = False
+            return False
+        
+        return True
+    
+    def get_product_ids(self, product_codes: List[str]) -> Dict[str, int]:
+        """批量查询产品代码对应的产品ID，优先使用索引"""
+        return self.product_ids.get_many(product_codes)
+    
+    def get_product_fingerprints(self, product_codes: List[str]) -> Dict[str, Tuple[int, str, str]]:
+        """
+        批量查询产品代码对应的(产品ID, 列表指纹, 内容指纹)
+        产品表尚未迁移时关闭指纹比对，指纹返回None
+        """
+        if self._fingerprints_supported:
+            try:
+                return self._query_fingerprints(product_codes, Product.list_hash, Product.content_hash)
+            except (OperationalError, ProgrammingError) as e:
+                self._disable_fingerprints(e)
+        
+        return {
+            code: (product_id, None, None)
+            for code, product_id in self._query_fingerprints(product_codes).items()
+        }
+    
+    def _query_fingerprints(self, product_codes: List[str], *columns) -> Dict[str, Any]:
+        """按IN_CLAUSE_CHUNK分批查询产品ID及附加字段，没有附加字段时值为产品ID"""
+        fingerprints = {}
+        for codes in chunked(product_codes, IN_CLAUSE_CHUNK):
+            for code, product_id, *values in self.db.query(
+                Product.product_code, Product.id, *columns
+            ).filter(Product.product_code.in_(codes)):
+                fingerprints[code] = (product_id, *values) if columns else product_id
+        return fingerprints
+    
+    def _disable_fingerprints(self, error: Exception):
+        """产品表缺少指纹字段时提示迁移，之后不再读写这些字段"""
+        self.db.rollback()
+        print(f"产品表缺少指纹字段，本次不跳过未变化的产品，请执行数据库迁移(--migrate-db): {str(error).splitlines()[0]}")
+        self._fingerprints_supported = False
+    
+    def get_known_products(self, company_name: str = None) -> Dict[str, Dict[str, Any]]:
+        """
+        查询已有产品的列表指纹和详情抓取日期，供爬虫跳过未变化的详情页
+        产品表尚未迁移时返回空字典，所有详情页都会抓取
+        """
+        if not self._fingerprints_supported:
+            return {}
+        
+        query = self.db.query(Product.product_code, Product.list_hash, Product.details_checked)
+        if company_name:
+            query = query.filter(Product.company_name == company_name)
+        
+        try:
+            return {
+                code: {"list_hash": list_hash, "details_checked": details_checked}
+                for code, list_hash, details_checked in query if list_hash
+            }
+        except (OperationalError, ProgrammingError) as e:
+            self._disable_fingerprints(e)
+            return {}
+    
+    def get_latest_return_dates(self, company_name: str = None) -> Dict[str, datetime.date]:
+        """查询每个产品已保存的最新收益日期，可按理财公司过滤"""
+        query = self.db.query(Product.product_code, func.max(DailyReturn.date)).join(
+            DailyReturn, DailyReturn.product_id == Product.id
+        )
+        if company_name:
+            query = query.filter(Product.company_name == company_name)
+        
+        return {code: last_date for code, last_date in query.group_by(Product.product_code) if last_date}
+    
+    def _get_daily_return_ids(self, keys) -> Dict[tuple, int]:
+        """批量查询(产品ID, 日期)对应的已有收益记录ID"""
+        keys = set(keys)
+        product_ids = sorted({product_id for product_id, _ in keys})
+        dates = [date for _, date in keys]
+        min_date, max_date = min(dates), max(dates)
+        
+        ids = {}
+        for chunk in chunked(product_ids, IN_CLAUSE_CHUNK):
+            query = self.db.query(DailyReturn.product_id, DailyReturn.date, DailyReturn.id).filter(
+                and_(
+                    DailyReturn.product_id.in_(chunk),
+                    DailyReturn.date >= min_date,
+                    DailyReturn.date <= max_date
+                )
+            )
+            for product_id, date, return_id in query:
+                if (product_id, date) in keys:
+                    ids[(product_id, date)] = return_id
+        return ids
+    
+    def _clean_product_row(self, product_data: Dict[str, Any]) -> Dict[str, Any]:
+        """过滤空值并转换日期字段"""
+        row = {}
+        for key, value in product_data.items():
+            # 跳过id和空值
+            if key == "id" or value is None:
+                continue
+            
+            # 处理日期类型字段
+            if key in PRODUCT_DATE_FIELDS and isinstance(value, str):
+                value = parse_date(value)
+            
+            row[key] = value
+        return row
     
     def save_product(self, product_data: Dict[str, Any]) -> Dict[str, Any]:
         """保存产品数据到数据库"""
@@ -73,7 +438,7 @@ class DataProcessor:
                     continue
                 
                 # 处理日期类型字段
-                if key in ["establishment_date", "maturity_date", "last_update"] and isinstance(value, str):
+                if key in PRODUCT_DATE_FIELDS and isinstance(value, str):
                     value = parse_date(value)
                 
                 setattr(existing_product, key, value)
@@ -92,7 +457,7 @@ class DataProcessor:
                     continue
                 
                 # 处理日期类型字段
-                if key in ["establishment_date", "maturity_date", "last_update"] and isinstance(value, str):
+                if key in PRODUCT_DATE_FIELDS and isinstance(value, str):
                     value = parse_date(value)
                 
                 setattr(product, key, value)
@@ -109,9 +474,8 @@ class DataProcessor:
             
             # 如果是新产品，获取新插入的ID
             if result["is_new"] and not result["id"]:
-                result["id"] = self.db.query(Product).filter(
-                    Product.product_code == product_data["product_code"]
-                ).first().id
+                result["id"] = product.id
+            self.product_ids.add(product_data["product_code"], result["id"])
                 
         except IntegrityError as e:
             self.db.rollback()
@@ -137,16 +501,14 @@ class DataProcessor:
             return_data["date"] = parse_date(return_data["date"])
         
         # 查询产品ID
-        product = self.db.query(Product).filter(
-            Product.product_code == return_data["product_code"]
-        ).first()
+        product_id = self.product_ids.get(return_data["product_code"])
         
-        if not product:
+        if not product_id:
             print(f"找不到产品代码 {return_data['product_code']} 对应的产品，无法保存收益数据")
             return result
         
         # 设置产品ID
-        return_data["product_id"] = product.id
+        return_data["product_id"] = product_id
         
         # 查询是否存在该收益记录
         existing_return = self.db.query(DailyReturn).filter(
@@ -185,12 +547,7 @@ class DataProcessor:
             
             # 如果是新收益记录，获取新插入的ID
             if result["is_new"] and not result["id"]:
-                result["id"] = self.db.query(DailyReturn).filter(
-                    and_(
-                        DailyReturn.product_id == return_data["product_id"],
-                        DailyReturn.date == return_data["date"]
-                    )
-                ).first().id
+                result["id"] = daily_return.id
                 
         except IntegrityError as e:
             self.db.rollback()
@@ -1,9 +1,69 @@
-from sqlalchemy import create_engine
+import os
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+# 默认数据库地址，可通过环境变量DATABASE_URL覆盖
+DEFAULT_DATABASE_URL = 'sqlite:///financial_products.db'
+
+# SQLite性能配置，每个新连接建立时设置
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",          # 读写并发，写入不阻塞读取
+    "synchronous": "NORMAL",        # WAL模式下安全且减少fsync
+    "mmap_size": 268435456,         # 256MB内存映射读取
+    "cache_size": -65536,           # 负数单位为KB，即64MB页缓存
+    "busy_timeout": 30000,          # 遇到锁时等待30秒而不是立即报"database is locked"
+    "temp_store": "MEMORY",
+}
+
+# PostgreSQL连接池配置
+POSTGRES_POOL_SIZE = 10
+POSTGRES_MAX_OVERFLOW = 20
+POSTGRES_POOL_RECYCLE = 1800
+
+
+def get_database_url() -> str:
+    """获取数据库地址，优先使用环境变量DATABASE_URL"""
+    return os.environ.get('DATABASE_URL') or DEFAULT_DATABASE_URL
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def create_db_engine(url: Optional[str] = None, echo: bool = False, **kwargs):
+    """
+    创建数据库引擎
+    SQLite启用WAL等性能配置，PostgreSQL使用指定大小的连接池
+    """
+    url = url or get_database_url()
+    backend = make_url(url).get_backend_name()
+
+    if backend == 'sqlite':
+        connect_args = kwargs.pop('connect_args', {})
+        connect_args.setdefault('check_same_thread', False)
+        connect_args.setdefault('timeout', SQLITE_PRAGMAS["busy_timeout"] / 1000)
+        engine = create_engine(url, echo=echo, connect_args=connect_args, **kwargs)
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+        return engine
+
+    if backend == 'postgresql':
+        kwargs.setdefault('pool_size', POSTGRES_POOL_SIZE)
+        kwargs.setdefault('max_overflow', POSTGRES_MAX_OVERFLOW)
+        kwargs.setdefault('pool_recycle', POSTGRES_POOL_RECYCLE)
+
+    kwargs.setdefault('pool_pre_ping', True)
+    return create_engine(url, echo=echo, **kwargs)
+
+
 # 创建数据库引擎
-engine = create_engine('sqlite:///financial_products.db')
+engine = create_db_engine()
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -11,14 +71,18 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # 创建Base类
 Base = declarative_base()
 
+def configure_database(url: Optional[str] = None, **kwargs):
+    """切换数据库，之后创建的会话都使用新的引擎"""
+    global engine
+    engine.dispose()
+    engine = create_db_engine(url, **kwargs)
+    SessionLocal.configure(bind=engine)
+    return engine
+
 def init_db():
     """初始化数据库，创建所有表"""
     Base.metadata.create_all(bind=engine)
 
 def get_db():
-    """获取数据库会话"""
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        db.close()
\ No newline at end of file
+    """获取数据库会话，使用完毕后由调用方关闭"""
+    return SessionLocal()
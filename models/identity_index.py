@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from .product import Product
+from ..utils import metrics as m
+
+# 批量查询时每次携带的产品代码数量，避免超过SQLite的变量数上限
+LOOKUP_CHUNK = 500
+
+# 有界索引默认保留的产品数量
+DEFAULT_MAX_SIZE = 100000
+
+
+class ProductIdIndex:
+    """
+    写入过程中共享的产品代码到产品ID的索引
+    可以一次性加载全部产品，也可以在需要时按批查询缺失的代码；
+    新插入的产品由写入方加入索引，之后的收益数据不再逐行查询产品
+    """
+
+    def __init__(self, db, company_name: Optional[str] = None):
+        self.db = db
+        self.company_name = company_name
+        self.hits = 0
+        self.misses = 0
+        self._ids: Dict[str, int] = {}
+
+    def load_all(self) -> int:
+        """一次性加载全部产品（指定了公司时只加载该公司），返回加载的数量"""
+        query = self.db.query(Product.product_code, Product.id)
+        if self.company_name:
+            query = query.filter(Product.company_name == self.company_name)
+        for code, product_id in query.yield_per(LOOKUP_CHUNK):
+            self._put(code, product_id)
+        return len(self)
+
+    def get(self, code: str) -> Optional[int]:
+        """查询单个产品代码对应的ID"""
+        return self.get_many([code]).get(code)
+
+    def get_many(self, codes: Iterable[str]) -> Dict[str, int]:
+        """批量查询产品代码对应的ID，索引中没有的代码合并为一次IN查询"""
+        ids = {}
+        missing = []
+        for code in dict.fromkeys(codes):
+            product_id = self._get(code)
+            if product_id is None:
+                missing.append(code)
+            else:
+                ids[code] = product_id
+        self.hits += len(ids)
+        self.misses += len(missing)
+        if ids:
+            m.get_metrics().inc(m.ID_INDEX_LOOKUPS, len(ids), result="hit")
+        if missing:
+            m.get_metrics().inc(m.ID_INDEX_LOOKUPS, len(missing), result="miss")
+
+        ids.update(self.load(missing))
+        return ids
+
+    def load(self, codes: Iterable[str]) -> Dict[str, int]:
+        """从数据库查询一批产品代码的ID并加入索引，不计入命中统计，如刚批量插入的产品"""
+        codes = list(codes)
+        ids = {}
+        for i in range(0, len(codes), LOOKUP_CHUNK):
+            chunk = codes[i:i + LOOKUP_CHUNK]
+            for code, product_id in self.db.query(Product.product_code, Product.id).filter(
+                Product.product_code.in_(chunk)
+            ):
+                self._put(code, product_id)
+                ids[code] = product_id
+        return ids
+
+    def add(self, code: str, product_id: int):
+        """记录新插入或已查到的产品"""
+        if code and product_id:
+            self._put(code, product_id)
+
+    def update(self, ids: Dict[str, int]):
+        """批量记录产品ID"""
+        for code, product_id in ids.items():
+            self.add(code, product_id)
+
+    def clear(self):
+        self._ids.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, code):
+        return code in self._ids
+
+    def _get(self, code: str) -> Optional[int]:
+        return self._ids.get(code)
+
+    def _put(self, code: str, product_id: int):
+        self._ids[code] = product_id
+
+
+class BoundedProductIdIndex(ProductIdIndex):
+    """
+    有界的产品ID索引，超过max_size时淘汰最久未使用的产品
+    用于产品数量很大、无法全部放入内存的情况，被淘汰的产品下次用到时再按批查询
+    """
+
+    def __init__(self, db, company_name: Optional[str] = None, max_size: int = DEFAULT_MAX_SIZE):
+        super().__init__(db, company_name)
+        self.max_size = max_size
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+
+    def load_all(self) -> int:
+        """加载产品直到达到容量上限"""
+        query = self.db.query(Product.product_code, Product.id)
+        if self.company_name:
+            query = query.filter(Product.company_name == self.company_name)
+        for code, product_id in query.limit(self.max_size).yield_per(LOOKUP_CHUNK):
+            self._put(code, product_id)
+        return len(self)
+
+    def _get(self, code: str) -> Optional[int]:
+        product_id = self._ids.get(code)
+        if product_id is not None:
+            self._ids.move_to_end(code)
+        return product_id
+
+    def _put(self, code: str, product_id: int):
+        self._ids[code] = product_id
+        self._ids.move_to_end(code)
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+
+def create_product_id_index(db, company_name: Optional[str] = None, preload: bool = False,
+                            max_size: Optional[int] = None) -> ProductIdIndex:
+    """创建产品ID索引，指定max_size时使用有界索引，preload为True时立即加载全部产品"""
+    if max_size:
+        index = BoundedProductIdIndex(db, company_name, max_size)
+    else:
+        index = ProductIdIndex(db, company_name)
+    if preload:
+        index.load_all()
+    return index
@@ -0,0 +1,62 @@
+from sqlalchemy import text, inspect
+
+from . import database
+from .database import Base
+from .product import Product
+from .daily_return import DailyReturn
+from .product_summary import ProductSummary  # noqa: F401  注册产品汇总表，供create_all使用
+
+# 被复合索引取代的旧单列索引
+REDUNDANT_DAILY_RETURN_INDEXES = [
+    "ix_daily_returns_product_id",
+    "ix_daily_returns_product_code",
+]
+
+
+def migrate_daily_return_indexes(engine=None):
+    """
+    迁移收益表索引
+    删除重复的(产品ID, 日期)记录后建立唯一复合索引和覆盖索引，并删除多余的单列索引
+    """
+    engine = engine or database.engine
+
+    with engine.begin() as conn:
+        # 重复记录只保留最后写入的一条，否则无法建立唯一索引；
+        # product_id为空的记录在唯一索引下互不冲突，不参与去重
+        deleted = conn.execute(text(
+            "DELETE FROM daily_returns WHERE product_id IS NOT NULL AND id NOT IN "
+            "(SELECT MAX(id) FROM daily_returns WHERE product_id IS NOT NULL GROUP BY product_id, date)"
+        )).rowcount
+        print(f"收益表去重: 删除了 {deleted} 条重复的(产品ID, 日期)记录，每组保留ID最大的一条")
+
+        for index in DailyReturn.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+        for name in REDUNDANT_DAILY_RETURN_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+# 产品表后来新增的字段
+PRODUCT_ADDED_COLUMNS = ["list_hash", "content_hash", "details_checked"]
+
+
+def migrate_product_columns(engine=None):
+    """为已有的产品表补充新增的字段"""
+    engine = engine or database.engine
+
+    existing = {column["name"] for column in inspect(engine).get_columns(Product.__tablename__)}
+    with engine.begin() as conn:
+        for name in PRODUCT_ADDED_COLUMNS:
+            if name in existing:
+                continue
+            column_type = Product.__table__.c[name].type.compile(dialect=engine.dialect)
+            conn.execute(text(f"ALTER TABLE {Product.__tablename__} ADD COLUMN {name} {column_type}"))
+            print(f"产品表新增字段 {name}")
+
+
+def migrate_db(engine=None):
+    """执行所有数据库迁移，缺失的表会先创建"""
+    engine = engine or database.engine
+    Base.metadata.create_all(bind=engine)
+    migrate_product_columns(engine)
+    migrate_daily_return_indexes(engine)
@@ -0,0 +1,162 @@
+import os
+import json
+import datetime
+from typing import Dict, Any, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text, Date
+
+from . import database
+from .product import Product
+
+# 每次从数据库读取的收益记录行数
+CHUNK_SIZE = 100000
+
+# 导出状态文件，记录已导出的最大收益记录ID
+STATE_FILE = "_export_state.json"
+
+PRODUCTS_FILE = "products.parquet"
+RETURNS_DIR = "daily_returns"
+
+# 产品表的日期字段，从模型定义中取得，之后新增的日期字段同样按日期类型导出
+PRODUCT_DATE_COLUMNS = tuple(column.name for column in Product.__table__.columns if isinstance(column.type, Date))
+
+# 收益数据的列类型，避免某个分块整列为空时推断出不一致的类型
+RETURNS_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("product_id", pa.int64()),
+    ("product_code", pa.string()),
+    ("date", pa.date32()),
+    ("unit_net_value", pa.float64()),
+    ("cumulative_net_value", pa.float64()),
+    ("daily_return_rate", pa.float64()),
+    ("seven_day_annualized", pa.float64()),
+    ("company_name", pa.string()),
+    ("month", pa.string()),
+])
+
+RETURNS_QUERY = """
+    SELECT r.id, r.product_id, r.product_code, r.date, r.unit_net_value, r.cumulative_net_value,
+           r.daily_return_rate, r.seven_day_annualized, p.company_name
+    FROM daily_returns r
+    JOIN products p ON p.id = r.product_id
+    WHERE r.id > :watermark
+    ORDER BY r.id
+"""
+
+
+class ParquetExporter:
+    """
+    把产品和每日收益导出为Parquet列式文件
+    收益数据按理财公司和月份分区，支持只追加上次导出之后新增的记录，
+    分析任务直接读取文件，不再占用抓取数据库
+    """
+
+    def __init__(self, output_dir: str, engine=None, chunk_size: int = CHUNK_SIZE):
+        self.output_dir = output_dir
+        self.engine = engine or database.engine
+        self.chunk_size = chunk_size
+        os.makedirs(output_dir, exist_ok=True)
+
+    def export(self, incremental: bool = True) -> Dict[str, int]:
+        """导出产品和收益数据"""
+        return {
+            "products": self.export_products(),
+            "daily_returns": self.export_returns(incremental),
+        }
+
+    def export_products(self) -> int:
+        """导出产品表，产品数量不大，每次整体覆盖"""
+        df = pd.read_sql("SELECT * FROM products", self.engine)
+        date_columns = [column for column in PRODUCT_DATE_COLUMNS if column in df]
+        for column in date_columns:
+            df[column] = pd.to_datetime(df[column], errors="coerce")
+
+        # 整列为空时也写为date32，与有值的导出文件类型一致
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        for column in date_columns:
+            index = table.schema.get_field_index(column)
+            table = table.set_column(index, column, table[column].cast(pa.timestamp("ns")).cast(pa.date32()))
+
+        pq.write_table(table, os.path.join(self.output_dir, PRODUCTS_FILE))
+        return len(df)
+
+    def export_returns(self, incremental: bool = True) -> int:
+        """
+        导出收益数据到 daily_returns/company_name=.../month=YYYY-MM/ 分区目录
+        增量模式只追加ID大于上次导出最大ID的记录，是仅追加的：已导出的记录在数据库中被原地更新
+        （重新抓取时的ON CONFLICT更新、批量更新）后不会重新导出，修正历史数据后需全量导出
+        """
+        state = self._load_state()
+        returns_dir = os.path.join(self.output_dir, RETURNS_DIR)
+
+        if not incremental:
+            self._clear_returns(returns_dir)
+            state["returns_watermark"] = 0
+
+        watermark = state.get("returns_watermark", 0)
+        run_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        exported = 0
+
+        chunks = pd.read_sql_query(text(RETURNS_QUERY), self.engine, params={"watermark": watermark},
+                                   parse_dates=["date"], chunksize=self.chunk_size)
+        for i, df in enumerate(chunks):
+            if df.empty:
+                continue
+
+            df["month"] = df["date"].dt.strftime("%Y-%m")
+            df["date"] = df["date"].dt.date
+            watermark = int(df["id"].max())
+
+            pq.write_to_dataset(
+                pa.Table.from_pandas(df, schema=RETURNS_SCHEMA, preserve_index=False),
+                root_path=returns_dir,
+                partition_cols=["company_name", "month"],
+                basename_template=f"part-{run_id}-{i}-{{i}}.parquet",
+            )
+            exported += len(df)
+
+            # 每个分块写完即更新状态，中断后不会重复导出
+            state["returns_watermark"] = watermark
+            state["exported_at"] = datetime.datetime.now().isoformat()
+            self._save_state(state)
+
+        return exported
+
+    def _load_state(self) -> Dict[str, Any]:
+        path = os.path.join(self.output_dir, STATE_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self, state: Dict[str, Any]):
+        path = os.path.join(self.output_dir, STATE_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _clear_returns(self, returns_dir: str):
+        for root, _, files in os.walk(returns_dir):
+            for name in files:
+                if name.endswith(".parquet"):
+                    os.remove(os.path.join(root, name))
+
+
+def read_returns(output_dir: str, columns: Optional[List[str]] = None,
+                 filters: Optional[List] = None) -> pa.Table:
+    """
+    以内存映射方式读取导出的收益数据
+    filters使用pyarrow的过滤格式，如 [("company_name", "=", "工商银行融e行"), ("month", ">=", "2023-01")]，
+    只会读取命中的分区
+    """
+    return pq.read_table(os.path.join(output_dir, RETURNS_DIR), columns=columns,
+                         filters=filters, memory_map=True)
+
+
+def read_products(output_dir: str, columns: Optional[List[str]] = None) -> pa.Table:
+    """以内存映射方式读取导出的产品数据"""
+    return pq.read_table(os.path.join(output_dir, PRODUCTS_FILE), columns=columns, memory_map=True)
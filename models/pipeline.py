@@ -0,0 +1,176 @@
+import queue
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from .data_processor import DataProcessor, BATCH_SIZE
+from ..scrapers.base_scraper import RECORD_PRODUCT, RECORD_RETURNS, RECORD_DONE, RECORD_FAILED
+from ..utils.checkpoint import CheckpointStore, STAGE_DETAILS, STAGE_RETURNS
+
+# 抓取线程与写入线程之间队列的容量（记录条数），队列满时抓取线程阻塞
+QUEUE_SIZE = 1000
+
+# 队列中长时间没有新记录时，写入线程最多等待的秒数就把已有记录落库
+FLUSH_INTERVAL = 5.0
+
+_STOP = object()
+
+
+class StreamingWriter:
+    """
+    流式写入器
+    爬虫产出的记录放入有界队列，写入线程按批次取出并保存到数据库，
+    内存占用与产品总数无关，已抓取的数据随时落库；
+    设置了断点记录时，每批落库后记录对应产品已完成的阶段，抓取失败的阶段不记录，断点续抓时重新获取；
+    preload_ids和max_cached_ids传给写入线程的DataProcessor，控制产品ID索引
+    """
+
+    def __init__(self, company_name: str, queue_size: int = QUEUE_SIZE,
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 checkpoint: Optional[CheckpointStore] = None,
+                 preload_ids: bool = False, max_cached_ids: Optional[int] = None):
+        self.company_name = company_name
+        self.checkpoint = checkpoint
+        self.preload_ids = preload_ids
+        self.max_cached_ids = max_cached_ids
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.results = {
+            "company_name": company_name,
+            "products_count": 0,
+            "products_updated": 0,
+            "products_new": 0,
+            "products_unchanged": 0,
+            "returns_count": 0,
+            "returns_new": 0,
+            "failed_count": 0
+        }
+        # 抓取失败的(产品代码, 阶段)，失败记录先于产品的其他记录产出，可能落在更早的批次，因此不随批次清空
+        self._failed = set()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._error = None
+
+    def start(self):
+        """启动写入线程"""
+        self._thread = threading.Thread(target=self._run, name=f"writer-{self.company_name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def put(self, kind: str, record: Any):
+        """放入一条记录，队列已满时阻塞等待写入线程消费"""
+        while True:
+            if self._error:
+                raise RuntimeError(f"写入线程已出错: {str(self._error)}")
+            try:
+                self._queue.put((kind, record), timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def close(self) -> Dict[str, Any]:
+        """等待剩余记录写入完成，返回汇总结果"""
+        if self._thread:
+            # 写入线程出错退出后队列可能已满，不能无限阻塞
+            while self._thread.is_alive():
+                try:
+                    self._queue.put(_STOP, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+            self._thread.join()
+            self._thread = None
+        if self._error:
+            raise RuntimeError(f"写入数据库失败: {str(self._error)}")
+        return self.results
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        processor = DataProcessor(self.preload_ids, self.max_cached_ids, self.company_name)
+        products: List[Dict[str, Any]] = []
+        returns: List[Dict[str, Any]] = []
+        done_codes: List[str] = []
+        last_flush = time.monotonic()
+
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    break
+
+                if item is not None:
+                    kind, record = item
+                    if kind == RECORD_PRODUCT:
+                        products.append(record)
+                    elif kind == RECORD_RETURNS:
+                        returns.extend(record)
+                    elif kind == RECORD_DONE:
+                        done_codes.append(record)
+                    elif kind == RECORD_FAILED:
+                        self._failed.add(tuple(record))
+                        self.results["failed_count"] += 1
+
+                pending = len(products) + len(returns) + len(done_codes)
+                if pending >= self.batch_size or (pending and time.monotonic() - last_flush >= self.flush_interval):
+                    self._flush(processor, products, returns, done_codes)
+                    products, returns, done_codes = [], [], []
+                    last_flush = time.monotonic()
+
+            if products or returns or done_codes:
+                self._flush(processor, products, returns, done_codes)
+        except Exception as e:
+            self._error = e
+            print(f"写入线程发生错误: {str(e)}")
+        finally:
+            self.results["id_index"] = processor.product_ids.stats()
+            processor.close()
+
+    def _flush(self, processor: DataProcessor, products: List[Dict[str, Any]],
+               returns: List[Dict[str, Any]], done_codes: List[str]):
+        """保存一批记录并累计结果"""
+        batch_result = processor.process_data({
+            "company_name": self.company_name,
+            "products": products,
+            "daily_returns": returns
+        }, self.batch_size)
+
+        for key in ("products_count", "products_updated", "products_new", "products_unchanged",
+                    "returns_count", "returns_new"):
+            self.results[key] += batch_result[key]
+
+        # 队列先进先出，完成标记之前的记录都已在本批或更早的批次落库
+        if self.checkpoint:
+            self.checkpoint.mark_done(self._succeeded([p.get("product_code") for p in products], STAGE_DETAILS),
+                                      STAGE_DETAILS)
+            self.checkpoint.mark_done(self._succeeded(done_codes, STAGE_RETURNS), STAGE_RETURNS)
+
+    def _succeeded(self, product_codes: List[str], stage: str) -> List[str]:
+        """去掉该阶段抓取失败的产品"""
+        return [code for code in product_codes if (code, stage) not in self._failed]
+
+
+def stream_scraper(scraper, max_products: Optional[int] = None, concurrency: Optional[int] = None,
+                   per_host_concurrency: Optional[int] = None,
+                   last_return_dates: Optional[Dict[str, Any]] = None,
+                   writer: Optional[StreamingWriter] = None) -> Dict[str, Any]:
+    """以流式模式运行爬虫，边抓取边写入数据库"""
+    writer = writer or StreamingWriter(scraper.company_name, checkpoint=scraper.checkpoint)
+    writer.start()
+    try:
+        if concurrency or per_host_concurrency:
+            scraper.run_concurrent(max_products, concurrency, per_host_concurrency,
+                                   last_return_dates=last_return_dates, on_record=writer.put)
+        else:
+            scraper.run(max_products, last_return_dates=last_return_dates, on_record=writer.put)
+    finally:
+        results = writer.close()
+    return results
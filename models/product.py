@@ -24,6 +24,9 @@ class Product(Base):
     description = Column(Text, comment="产品描述")
     details_url = Column(String(255), comment="产品详情页URL")
     last_update = Column(Date, comment="最后更新日期")
+    list_hash = Column(String(40), comment="列表条目内容指纹")
+    content_hash = Column(String(40), comment="产品完整内容指纹")
+    details_checked = Column(Date, comment="最近一次抓取详情的日期")
     
     # 建立与每日收益表的关系
     daily_returns = relationship("DailyReturn", back_populates="product")
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, Float, Date, DateTime, String, ForeignKey
+
+from .database import Base
+
+class ProductSummary(Base):
+    """产品收益汇总模型，每个产品一行，随收益数据写入增量维护"""
+    __tablename__ = "product_summaries"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    product_code = Column(String(50), index=True, comment="产品代码")
+    latest_date = Column(Date, comment="最新收益日期")
+    latest_unit_net_value = Column(Float, comment="最新单位净值")
+    latest_cumulative_net_value = Column(Float, comment="最新累计净值")
+    daily_return_rate = Column(Float, comment="最新日收益率(%)")
+    seven_day_annualized = Column(Float, comment="最新7日年化收益率(%)")
+    return_30d = Column(Float, comment="近30日收益率(%)")
+    returns_count = Column(Integer, comment="收益记录条数")
+    updated_at = Column(DateTime, comment="汇总更新时间")
+    
+    def __repr__(self):
+        return f"<ProductSummary {self.product_code}: {self.latest_date} - {self.latest_unit_net_value}>"
@@ -0,0 +1,184 @@
+import datetime
+from typing import Dict, Any, List, Iterable, Optional, Tuple
+
+from sqlalchemy import func
+
+from .product import Product
+from .daily_return import DailyReturn
+from .product_summary import ProductSummary
+
+# 每次刷新的产品数量，避免IN查询参数过多
+REFRESH_CHUNK = 500
+
+# 近N日收益率的天数，以及向前寻找基准净值的最大天数
+RETURN_PERIOD_DAYS = 30
+BASE_LOOKBACK_DAYS = 10
+
+
+def refresh_product_summaries(db, product_ids: Iterable[int]) -> int:
+    """
+    按全部收益记录重新计算指定产品的汇总行，用于全量重建；
+    写入收益数据后的增量维护使用update_product_summaries
+    返回刷新的产品数量
+    """
+    product_ids = sorted(set(product_ids))
+    refreshed = 0
+
+    for i in range(0, len(product_ids), REFRESH_CHUNK):
+        chunk = product_ids[i:i + REFRESH_CHUNK]
+        rows = _build_summaries(db, chunk)
+
+        db.query(ProductSummary).filter(ProductSummary.product_id.in_(chunk)).delete(synchronize_session=False)
+        if rows:
+            db.bulk_insert_mappings(ProductSummary, rows)
+        db.commit()
+        refreshed += len(rows)
+
+    return refreshed
+
+
+def update_product_summaries(db, changes: Dict[int, Optional[Dict[str, Any]]]) -> int:
+    """
+    按本次写入的收益记录增量更新汇总行，不聚合产品的全部历史
+    changes为产品ID到 {"inserted": 新插入的记录数, "max_date": 写入的最晚日期}：
+    记录条数在原值上累加，最新日期取原最新日期和写入日期的较大者；
+    写入的日期落在最新日期或30日基准窗口内时，再读取最新记录和基准净值重新计算收益字段，
+    只回补更早历史的产品只更新记录条数。
+    值为None（写入情况未知）或还没有汇总行的产品按全部记录计算
+    返回更新的产品数量
+    """
+    product_ids = sorted(changes)
+    window = datetime.timedelta(days=RETURN_PERIOD_DAYS + BASE_LOOKBACK_DAYS)
+    now = datetime.datetime.now()
+    updated = 0
+
+    for i in range(0, len(product_ids), REFRESH_CHUNK):
+        chunk = product_ids[i:i + REFRESH_CHUNK]
+        existing = {
+            product_id: (latest_date, returns_count)
+            for product_id, latest_date, returns_count in db.query(
+                ProductSummary.product_id, ProductSummary.latest_date, ProductSummary.returns_count
+            ).filter(ProductSummary.product_id.in_(chunk))
+        }
+
+        full = []
+        recompute = {}
+        updates = []
+        for product_id in chunk:
+            change = changes[product_id]
+            latest_date, returns_count = existing.get(product_id, (None, None))
+            if change is None or latest_date is None:
+                full.append(product_id)
+                continue
+
+            returns_count = (returns_count or 0) + change["inserted"]
+            if change["max_date"] > latest_date - window:
+                recompute[product_id] = (max(latest_date, change["max_date"]), returns_count)
+            else:
+                updates.append({"product_id": product_id, "returns_count": returns_count, "updated_at": now})
+
+        if recompute:
+            updates.extend(_summaries_at(db, recompute))
+        if updates:
+            db.bulk_update_mappings(ProductSummary, updates)
+
+        if full:
+            rows = _build_summaries(db, full)
+            db.query(ProductSummary).filter(ProductSummary.product_id.in_(full)).delete(synchronize_session=False)
+            if rows:
+                db.bulk_insert_mappings(ProductSummary, rows)
+
+        db.commit()
+        updated += len(updates) + len(full)
+
+    return updated
+
+
+def rebuild_product_summaries(db) -> int:
+    """全量重建汇总表"""
+    db.query(ProductSummary).delete(synchronize_session=False)
+    db.commit()
+
+    product_ids = [product_id for (product_id,) in db.query(DailyReturn.product_id).distinct()]
+    return refresh_product_summaries(db, product_ids)
+
+
+def get_product_summaries(db, company_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """查询产品汇总，附带产品名称和公司"""
+    query = db.query(ProductSummary, Product.product_name, Product.company_name).join(
+        Product, Product.id == ProductSummary.product_id
+    )
+    if company_name:
+        query = query.filter(Product.company_name == company_name)
+
+    results = []
+    for summary, product_name, product_company in query:
+        row = {column.name: getattr(summary, column.name) for column in ProductSummary.__table__.columns}
+        row["product_name"] = product_name
+        row["company_name"] = product_company
+        results.append(row)
+    return results
+
+
+def _build_summaries(db, product_ids: List[int]) -> List[Dict[str, Any]]:
+    """按全部收益记录计算一批产品的汇总数据"""
+    aggregates = db.query(
+        DailyReturn.product_id,
+        func.max(DailyReturn.date),
+        func.count(DailyReturn.id)
+    ).filter(DailyReturn.product_id.in_(product_ids)).group_by(DailyReturn.product_id)
+
+    latest = {product_id: (latest_date, returns_count) for product_id, latest_date, returns_count in aggregates}
+    return _summaries_at(db, latest)
+
+
+def _summaries_at(db, latest: Dict[int, Tuple[datetime.date, int]]) -> List[Dict[str, Any]]:
+    """
+    按已知的最新日期和记录条数计算汇总数据
+    latest为产品ID到(最新日期, 收益记录条数)，只读取最新日期的记录和30日前的基准净值
+    """
+    # 各产品的最新日期通常相同，按最新日期分组后每组一次查询
+    by_date: Dict[datetime.date, List[int]] = {}
+    for product_id, (latest_date, _) in latest.items():
+        by_date.setdefault(latest_date, []).append(product_id)
+
+    now = datetime.datetime.now()
+    summaries = {}
+    for latest_date, ids in by_date.items():
+        latest_rows = db.query(DailyReturn).filter(
+            DailyReturn.product_id.in_(ids),
+            DailyReturn.date == latest_date
+        )
+        for row in latest_rows:
+            summaries[row.product_id] = {
+                "product_id": row.product_id,
+                "product_code": row.product_code,
+                "latest_date": row.date,
+                "latest_unit_net_value": row.unit_net_value,
+                "latest_cumulative_net_value": row.cumulative_net_value,
+                "daily_return_rate": row.daily_return_rate,
+                "seven_day_annualized": row.seven_day_annualized,
+                "return_30d": None,
+                "returns_count": latest[row.product_id][1],
+                "updated_at": now,
+            }
+
+        # 每组一次范围查询找30日前的基准净值
+        base_date = latest_date - datetime.timedelta(days=RETURN_PERIOD_DAYS)
+        base_rows = db.query(DailyReturn.product_id, DailyReturn.date, DailyReturn.unit_net_value).filter(
+            DailyReturn.product_id.in_(ids),
+            DailyReturn.date <= base_date,
+            DailyReturn.date > base_date - datetime.timedelta(days=BASE_LOOKBACK_DAYS)
+        ).order_by(DailyReturn.product_id, DailyReturn.date)
+
+        base_navs = {}
+        for product_id, _, unit_net_value in base_rows:
+            if unit_net_value:
+                base_navs[product_id] = unit_net_value
+
+        for product_id, base_nav in base_navs.items():
+            summary = summaries.get(product_id)
+            if summary and summary["latest_unit_net_value"]:
+                summary["return_30d"] = (summary["latest_unit_net_value"] / base_nav - 1) * 100
+
+    return list(summaries.values())
@@ -1,28 +1,84 @@
-import time
-import random
+import asyncio
+import functools
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Callable
+from urllib.parse import urlparse
 import datetime
 
 from ..utils.parser import fetch_page, parse_html, normalize_url
+from ..utils.browser_pool import get_browser_pool
+from ..utils.date_utils import get_today
+from ..utils.checkpoint import STAGE_DETAILS, STAGE_RETURNS
+from ..utils.fingerprint import fingerprint
+from ..utils import metrics as m
+from ..utils import profiling
+
+# 流式抓取产出的记录类型
+RECORD_PRODUCT = "product"
+RECORD_RETURNS = "daily_returns"
+# 某个产品的全部记录已产出，记录内容为产品代码
+RECORD_DONE = "product_done"
+# 产品某个阶段抓取失败，记录内容为(产品代码, 阶段)，该阶段不记为完成，断点续抓时重新获取
+RECORD_FAILED = "product_failed"
 
 
 class BaseScraper(ABC):
     """基础爬虫类，所有具体爬虫类都应继承此类"""
     
+    # 并发抓取模式的默认限制：全局并发数和单个主机的并发数
+    max_concurrency = 8
+    per_host_concurrency = 4
+    
+    # 并发模式下同时处理中的产品数为全局并发数的倍数，包括已抓取完、等待交给回调的产品
+    in_flight_factor = 2
+    
+    # 增量模式下首次抓取某产品时回补的历史天数
+    full_history_days = 3650
+    
+    # 列表条目未变化的产品，详情超过这么多天未抓取时才重新抓取
+    details_refresh_days = 7
+    
+    # HTML解析后端，'lxml'使用预编译选择器，'bs4'使用BeautifulSoup
+    parser_backend = 'bs4'
+    
+    # 页面获取方式，'browser'从无头浏览器池中取浏览器渲染JavaScript页面，
+    # browser_wait_selector为渲染完成的标志元素
+    fetch_backend = 'requests'
+    browser_wait_selector = None
+    
     def __init__(self, company_name: str, company_url: str):
         self.company_name = company_name
         self.company_url = normalize_url(company_url)
         self.base_url = self.company_url
+        # 断点记录，设置后会跳过已完成的抓取工作
+        self.checkpoint = None
+        # 数据库中已有产品的列表指纹和详情抓取日期，设置后跳过未变化产品的详情
+        self.known_products = None
         
-    def get_page(self, url):
-        """获取页面内容"""
-        html = fetch_page(url)
+    def get_page(self, url, only=None):
+        """
+        获取页面内容
+        only为class名称列表时只解析这些区域（BeautifulSoup后端）
+        """
+        with self.stage(profiling.STAGE_FETCH):
+            html = self.fetch_html(url)
         if not html:
             return None
-        soup = parse_html(html)
+        with self.stage(profiling.STAGE_PARSE):
+            soup = parse_html(html, self.parser_backend, only)
         return soup
     
+    def stage(self, name: str):
+        """标记抓取阶段（请求、解析、提取），耗时按公司和阶段计入指标，性能分析时按阶段归类调用栈"""
+        return profiling.stage(name, company=self.company_name)
+    
+    def fetch_html(self, url):
+        """按fetch_backend获取页面HTML"""
+        if self.fetch_backend == 'browser':
+            return get_browser_pool().fetch(url, wait_for=self.browser_wait_selector)
+        return fetch_page(url)
+    
     @abstractmethod
     def get_product_list(self) -> List[Dict[str, Any]]:
         """
@@ -32,61 +88,331 @@ class BaseScraper(ABC):
         pass
     
     @abstractmethod
-    def get_product_details(self, product_url: str) -> Dict[str, Any]:
+    def get_product_details(self, product_url: str) -> Optional[Dict[str, Any]]:
         """
         获取产品详情
-        返回单个产品的详细信息
+        返回单个产品的详细信息，页面获取失败时返回None
         """
         pass
     
     @abstractmethod
-    def get_product_returns(self, product_code: str, days: int = 30) -> List[Dict[str, Any]]:
+    def get_product_returns(self, product_code: str, days: int = 30) -> Optional[List[Dict[str, Any]]]:
         """
         获取产品收益信息
-        返回产品收益信息字典的列表
+        返回产品收益信息字典的列表，接口请求或解析失败时返回None
         """
         pass
     
-    def run(self, max_products: Optional[int] = None) -> Dict[str, Any]:
+    def get_returns_days(self, product: Dict[str, Any],
+                         last_return_dates: Optional[Dict[str, datetime.date]]) -> Optional[int]:
         """
-        运行爬虫，获取所有产品及其收益信息
-        返回所有数据
+        计算增量模式下需要抓取的收益天数
+        已有收益记录时只抓取最新日期之后的部分，没有记录时回补完整历史，
+        返回None表示数据已是最新，无需抓取
         """
-        print(f"开始抓取 {self.company_name} 的数据...")
+        today = get_today()
+        last_date = last_return_dates.get(product['product_code'])
+        
+        if last_date:
+            days = (today - last_date).days - 1
+            return days if days >= 0 else None
+        
+        establishment_date = product.get('establishment_date')
+        if isinstance(establishment_date, datetime.date):
+            return max((today - establishment_date).days, 0)
+        
+        return self.full_history_days
+    
+    def get_returns_url(self) -> str:
+        """收益接口的地址，并发模式下按其所在主机限制收益请求的并发数；收益接口不在网站主机上的子类需要覆盖"""
+        return self.base_url
+    
+    def fetch_returns(self, product: Dict[str, Any],
+                      last_return_dates: Optional[Dict[str, datetime.date]] = None) -> Optional[List[Dict[str, Any]]]:
+        """获取产品收益信息，传入各产品最新收益日期时按增量方式抓取，获取失败时返回None"""
+        if last_return_dates is None:
+            return self.get_product_returns(product['product_code'])
+        
+        days = self.get_returns_days(product, last_return_dates)
+        if days is None:
+            print(f"产品 {product['product_code']} 收益数据已是最新，跳过")
+            return []
         
+        return self.get_product_returns(product['product_code'], days)
+    
+    def iter_records(self, max_products: Optional[int] = None,
+                     last_return_dates: Optional[Dict[str, datetime.date]] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        逐个产品抓取并流式产出记录
+        每个产品依次产出 (RECORD_PRODUCT, 产品字典)、(RECORD_RETURNS, 收益记录列表)
+        和 (RECORD_DONE, 产品代码)，详情或收益获取失败时先产出 (RECORD_FAILED, (产品代码, 阶段))；
+        设置了断点记录时跳过已完成的阶段
+        """
         # 获取产品列表
         products = self.get_product_list()
         if max_products:
             products = products[:max_products]
         
-        result = {
-            "company_name": self.company_name,
-            "company_url": self.company_url,
-            "crawl_time": datetime.datetime.now().isoformat(),
-            "products": [],
-            "daily_returns": []
-        }
-        
         # 遍历产品列表，获取详情和收益信息
         for i, product in enumerate(products):
+            code = product.get('product_code')
+            details_done = self.is_stage_done(code, STAGE_DETAILS)
+            returns_done = self.is_stage_done(code, STAGE_RETURNS)
+            if details_done and returns_done:
+                continue
+            
             print(f"正在处理第 {i+1}/{len(products)} 个产品: {product.get('product_name', '')}...")
             
-            # 获取产品详情
-            if product.get('details_url'):
-                details = self.get_product_details(product['details_url'])
-                if details:
-                    product.update(details)
+            # 获取产品详情，列表条目未变化且详情近期抓取过的产品跳过
+            product['list_hash'] = fingerprint(product)
+            fetch_details = not details_done and self.should_fetch_details(product)
+            details = self.get_product_details(product['details_url']) if fetch_details else None
+            self.merge_details(product, details, fetch_details)
             
             # 获取产品收益信息
-            if product.get('product_code'):
-                returns = self.get_product_returns(product['product_code'])
+            returns = None
+            fetch_returns = bool(code) and not returns_done
+            if fetch_returns:
+                returns = self.fetch_returns(product, last_return_dates)
+            
+            for failed in self.failed_stages(code, fetch_details and details is None,
+                                             fetch_returns and returns is None):
+                yield RECORD_FAILED, failed
+            
+            # 先产出产品再产出收益，保证写入收益时产品已经存在
+            if not details_done:
+                yield RECORD_PRODUCT, product
+            if returns:
+                yield RECORD_RETURNS, returns
+            if code:
+                yield RECORD_DONE, code
+    
+    def should_fetch_details(self, product: Dict[str, Any]) -> bool:
+        """判断是否需要抓取产品详情"""
+        if not product.get('details_url'):
+            return False
+        
+        known = self.known_products.get(product.get('product_code')) if self.known_products else None
+        if not known or known.get('list_hash') != product.get('list_hash'):
+            return True
+        
+        checked = known.get('details_checked')
+        return not checked or (get_today() - checked).days >= self.details_refresh_days
+    
+    def merge_details(self, product: Dict[str, Any], details: Optional[Dict[str, Any]], fetched: bool):
+        """
+        合并产品详情并计算内容指纹
+        详情被跳过或抓取失败时不计算内容指纹，保存时只按列表指纹判断是否变化
+        """
+        if details:
+            product.update(details)
+            product['details_checked'] = get_today()
+        if details or (not fetched and not product.get('details_url')):
+            product['content_hash'] = fingerprint(product)
+    
+    def failed_stages(self, product_code: Optional[str], details_failed: bool,
+                      returns_failed: bool) -> List[Tuple[str, str]]:
+        """抓取失败的阶段，作为RECORD_FAILED记录产出"""
+        if not product_code:
+            return []
+        stages = [STAGE_DETAILS] if details_failed else []
+        if returns_failed:
+            stages.append(STAGE_RETURNS)
+        return [(product_code, stage) for stage in stages]
+    
+    def is_stage_done(self, product_code: Optional[str], stage: str) -> bool:
+        """根据断点记录判断产品的某个抓取阶段是否已完成"""
+        return bool(self.checkpoint and product_code and self.checkpoint.is_done(product_code, stage))
+    
+    def run(self, max_products: Optional[int] = None,
+            last_return_dates: Optional[Dict[str, datetime.date]] = None,
+            on_record: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """
+        运行爬虫，获取所有产品及其收益信息
+        传入last_return_dates时以增量模式抓取收益数据；
+        传入on_record时每条记录抓取后立即交给回调处理，不在结果中保留
+        返回所有数据
+        """
+        print(f"开始抓取 {self.company_name} 的数据...")
+        
+        result = self._new_result()
+        with m.get_metrics().timer(m.SCRAPER_SECONDS, company=self.company_name, mode="sequential"):
+            for kind, record in self.iter_records(max_products, last_return_dates):
+                self._collect(result, kind, record, on_record)
+        
+        print(f"完成抓取 {self.company_name} 的数据，共 {result['products_count']} 个产品，{result['returns_count']} 条收益记录")
+        return result
+    
+    def run_concurrent(self, max_products: Optional[int] = None,
+                       max_concurrency: Optional[int] = None,
+                       per_host_concurrency: Optional[int] = None,
+                       last_return_dates: Optional[Dict[str, datetime.date]] = None,
+                       on_record: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """
+        以并发模式运行爬虫，返回结构与run相同
+        """
+        with m.get_metrics().timer(m.SCRAPER_SECONDS, company=self.company_name, mode="concurrent"):
+            return asyncio.run(self.run_async(max_products, max_concurrency, per_host_concurrency,
+                                              last_return_dates, on_record))
+    
+    async def run_async(self, max_products: Optional[int] = None,
+                        max_concurrency: Optional[int] = None,
+                        per_host_concurrency: Optional[int] = None,
+                        last_return_dates: Optional[Dict[str, datetime.date]] = None,
+                        on_record: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """
+        基于asyncio的并发抓取
+        产品详情和收益信息在线程池中并发获取，受全局并发数和单主机并发数限制，
+        增量模式下尚无收益记录的产品先取详情，按成立日期计算回补天数；子类的同步方法无需改写；传入on_record时每个产品完成后立即交给回调处理，
+        回调在单独的线程中按完成顺序调用，回调阻塞（如写入队列已满）时不影响进行中的请求，
+        同时处理中的产品数有上限，已抓取未交出的产品不会无限堆积
+        """
+        max_concurrency = max_concurrency or self.max_concurrency
+        per_host_concurrency = per_host_concurrency or self.per_host_concurrency
+        
+        print(f"开始并发抓取 {self.company_name} 的数据 (全局并发 {max_concurrency}，单主机并发 {per_host_concurrency})...")
+        
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        global_semaphore = asyncio.Semaphore(max_concurrency)
+        host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        # 回调可能阻塞，在单线程中调用，保持同一产品记录的顺序
+        record_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="on-record") if on_record else None
+        in_flight = asyncio.Semaphore(max_concurrency * self.in_flight_factor)
+        
+        async def call(url: str, func, *args):
+            host = urlparse(url).netloc or urlparse(self.base_url).netloc
+            if host not in host_semaphores:
+                host_semaphores[host] = asyncio.Semaphore(per_host_concurrency)
+            # 先取主机并发额度再取全局额度，等待慢主机的任务不会占住全局额度
+            async with host_semaphores[host]:
+                async with global_semaphore:
+                    return await loop.run_in_executor(executor, functools.partial(func, *args))
+        
+        try:
+            # 获取产品列表
+            products = await loop.run_in_executor(executor, self.get_product_list)
+            if max_products:
+                products = products[:max_products]
+            
+            result = self._new_result()
+            
+            total = len(products)
+            done = 0
+            
+            def emit(product, returns, failed, code):
+                for record in failed:
+                    self._collect(result, RECORD_FAILED, record, on_record)
+                if product is not None:
+                    self._collect(result, RECORD_PRODUCT, product, on_record)
                 if returns:
-                    result["daily_returns"].extend(returns)
+                    self._collect(result, RECORD_RETURNS, returns, on_record)
+                if code:
+                    self._collect(result, RECORD_DONE, code, on_record)
             
-            result["products"].append(product)
+            async def process(product: Dict[str, Any]):
+                async with in_flight:
+                    return await fetch_product(product)
             
-            # 随机延时，避免被反爬
-            time.sleep(random.uniform(1, 3))
+            async def fetch_product(product: Dict[str, Any]):
+                nonlocal done
+                code = product.get('product_code')
+                details_done = self.is_stage_done(code, STAGE_DETAILS)
+                returns_done = self.is_stage_done(code, STAGE_RETURNS)
+                if details_done and returns_done:
+                    return None, [], []
+                
+                tasks = []
+                product['list_hash'] = fingerprint(product)
+                fetch_details = not details_done and self.should_fetch_details(product)
+                fetch_returns = bool(code) and not returns_done
+                if fetch_details:
+                    tasks.append(call(product['details_url'], self.get_product_details, product['details_url']))
+                else:
+                    tasks.append(asyncio.sleep(0))
+                
+                # 增量模式下没有收益记录的产品按详情中的成立日期回补，先取得详情再计算收益天数
+                returns_product = product
+                if (fetch_details and fetch_returns and last_return_dates is not None
+                        and not last_return_dates.get(code) and not product.get('establishment_date')):
+                    details, = await asyncio.gather(tasks[0], return_exceptions=True)
+                    if isinstance(details, dict):
+                        returns_product = dict(product, **details)
+                    tasks[0] = asyncio.sleep(0, details)
+                
+                if fetch_returns:
+                    tasks.append(call(self.get_returns_url(), self.fetch_returns, returns_product, last_return_dates))
+                else:
+                    tasks.append(asyncio.sleep(0))
+                
+                details, returns = await asyncio.gather(*tasks, return_exceptions=True)
+                
+                if isinstance(details, Exception):
+                    print(f"获取产品 {product.get('product_name', '')} 详情失败: {str(details)}")
+                    details = None
+                self.merge_details(product, details, fetch_details)
+                
+                if isinstance(returns, Exception):
+                    print(f"获取产品 {product.get('product_code', '')} 收益信息失败: {str(returns)}")
+                    returns = None
+                
+                failed = self.failed_stages(code, fetch_details and details is None,
+                                            fetch_returns and returns is None)
+                
+                done += 1
+                print(f"已完成 {done}/{total} 个产品: {product.get('product_name', '')}")
+                
+                if details_done:
+                    product = None
+                
+                if on_record:
+                    await loop.run_in_executor(record_executor, emit, product, returns, failed, code)
+                    return None, [], []
+                return product, returns or [], failed
+            
+            # 按产品列表顺序汇总结果
+            for product, returns, failed in await asyncio.gather(*(process(p) for p in products)):
+                for record in failed:
+                    self._collect(result, RECORD_FAILED, record)
+                if product is not None:
+                    self._collect(result, RECORD_PRODUCT, product)
+                if returns:
+                    self._collect(result, RECORD_RETURNS, returns)
+        finally:
+            executor.shutdown(wait=False)
+            if record_executor:
+                record_executor.shutdown(wait=True)
+        
+        print(f"完成抓取 {self.company_name} 的数据，共 {result['products_count']} 个产品，{result['returns_count']} 条收益记录")
+        return result
+    
+    def _new_result(self) -> Dict[str, Any]:
+        """创建空的抓取结果"""
+        return {
+            "company_name": self.company_name,
+            "company_url": self.company_url,
+            "crawl_time": datetime.datetime.now().isoformat(),
+            "products": [],
+            "daily_returns": [],
+            "products_count": 0,
+            "returns_count": 0
+        }
+    
+    def _collect(self, result: Dict[str, Any], kind: str, record: Any,
+                 on_record: Optional[Callable[[str, Any], None]] = None):
+        """把记录加入结果或交给回调"""
+        if kind == RECORD_PRODUCT:
+            result["products_count"] += 1
+            m.get_metrics().inc(m.SCRAPER_RECORDS, company=self.company_name, kind=kind)
+        elif kind == RECORD_RETURNS:
+            result["returns_count"] += len(record)
+            m.get_metrics().inc(m.SCRAPER_RECORDS, len(record), company=self.company_name, kind=kind)
+        elif kind == RECORD_FAILED:
+            m.get_metrics().inc(m.SCRAPER_ERRORS, company=self.company_name, stage=record[1])
         
-        print(f"完成抓取 {self.company_name} 的数据，共 {len(result['products'])} 个产品，{len(result['daily_returns'])} 条收益记录")
-        return result 
\ No newline at end of file
+        if on_record:
+            on_record(kind, record)
+        elif kind == RECORD_PRODUCT:
+            result["products"].append(record)
+        elif kind == RECORD_RETURNS:
+            result["daily_returns"].extend(record)
@@ -0,0 +1,470 @@
+import os
+import re
+import json
+import math
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from urllib.parse import urljoin
+
+from ..utils.parser import fetch_page, clean_text, compile_css, LxmlNode
+from ..utils.date_utils import parse_date, get_today
+from ..utils.profiling import STAGE_FETCH, STAGE_PARSE, STAGE_EXTRACT
+from .base_scraper import BaseScraper
+
+# 内置的爬虫定义目录
+SPEC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "specs")
+
+SPEC_SUFFIXES = (".json", ".yaml", ".yml")
+
+# JSON列表接口的默认每页条数和并发请求数
+LIST_API_PAGE_SIZE = 100
+LIST_API_CONCURRENCY = 4
+
+
+def _to_float(value: str) -> float:
+    return float(value.replace(",", ""))
+
+
+def _to_int(value: str) -> int:
+    return int(float(value.replace(",", "")))
+
+
+# 字段类型转换器，转换失败的字段不写入结果
+CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "str": lambda value: value,
+    "float": _to_float,
+    "int": _to_int,
+    "percent": lambda value: _to_float(value.strip().rstrip("%")),
+    "date": parse_date,
+}
+
+
+class FieldExtractor:
+    """
+    编译后的单个字段提取器
+    选择器、正则和类型转换在编译时确定，提取时不再解析定义
+    """
+
+    def __init__(self, name: str, spec: Any, base_url: str):
+        if isinstance(spec, str):
+            spec = {"selector": spec}
+
+        self.name = name
+        self.selector = spec.get("selector")
+        self.attr = spec.get("attr")
+        self.key = spec.get("key", name)
+        self.regex = re.compile(spec["regex"]) if spec.get("regex") else None
+
+        type_name = spec.get("type", "str")
+        if type_name == "url":
+            self.convert = lambda value: value if value.startswith("http") else urljoin(base_url, value)
+        elif type_name in CONVERTERS:
+            self.convert = CONVERTERS[type_name]
+        else:
+            raise ValueError(f"字段 {name} 的类型 {type_name} 不受支持")
+
+        # lxml后端直接使用预编译的选择器，跳过节点包装；首次用lxml提取时才编译，
+        # 未安装cssselect时parse_html改用BeautifulSoup，不会走到这里
+        self._css = None
+
+    def extract(self, node) -> Optional[Any]:
+        """从页面节点中提取字段值，找不到或转换失败时返回None"""
+        if isinstance(node, LxmlNode):
+            if self._css is None:
+                self._css = compile_css(self.selector)
+            element = node.element
+            matches = self._css(element)
+            target = next((m for m in matches if m is not element), None)
+            if target is None:
+                return None
+            value = target.get(self.attr) if self.attr else clean_text(target.text_content())
+        else:
+            target = node.select_one(self.selector)
+            if target is None:
+                return None
+            value = target.get(self.attr) if self.attr else clean_text(target.text)
+        return self._finish(value)
+
+    def extract_json(self, item: Dict[str, Any]) -> Optional[Any]:
+        """从JSON对象中按key提取字段值"""
+        value = item.get(self.key)
+        if value is None:
+            return None
+        if not isinstance(value, str):
+            value = str(value)
+        return self._finish(value)
+
+    def _finish(self, value: Optional[str]) -> Optional[Any]:
+        if not value:
+            return None
+        if self.regex:
+            match = self.regex.search(value)
+            if not match:
+                return None
+            value = match.group(1) if match.groups() else match.group(0)
+        try:
+            return self.convert(value)
+        except (ValueError, TypeError):
+            return None
+
+
+class RecordExtractor:
+    """编译后的一组字段，从一个页面或一个列表条目中提取一条记录"""
+
+    def __init__(self, spec: Dict[str, Any], base_url: str):
+        self.fields = [FieldExtractor(name, field, base_url) for name, field in spec.get("fields", {}).items()]
+        self.item = spec.get("item")
+        self.required = tuple(spec.get("required", ()))
+        self.sections = spec.get("sections")
+
+    def extract(self, node) -> Dict[str, Any]:
+        record = {}
+        for field in self.fields:
+            value = field.extract(node)
+            if value is not None:
+                record[field.name] = value
+        return record
+
+    def extract_items(self, root) -> List[Dict[str, Any]]:
+        """提取页面中每个条目，缺少必需字段的条目被丢弃"""
+        records = []
+        for item in root.select(self.item):
+            record = self.extract(item)
+            if all(key in record for key in self.required):
+                records.append(record)
+        return records
+
+    def extract_json(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        record = {}
+        for field in self.fields:
+            value = field.extract_json(item)
+            if value is not None:
+                record[field.name] = value
+        return record
+
+
+def get_json_path(data: Any, path: str) -> Any:
+    """按点分隔的路径读取JSON中的值，如 "data.list"，路径不存在时返回None"""
+    for key in path.split("."):
+        data = data.get(key) if isinstance(data, dict) else None
+    return data
+
+
+def rebase_spec(spec: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+    """
+    把定义中以原base_url开头的地址替换为新的base_url，返回新的定义
+    用于指向镜像站点或本地测试服务器
+    """
+    old_base = spec["base_url"].rstrip("/")
+    new_base = base_url.rstrip("/")
+
+    def rebase(value):
+        if isinstance(value, dict):
+            return {key: rebase(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [rebase(item) for item in value]
+        if isinstance(value, str) and value.startswith(old_base):
+            return new_base + value[len(old_base):]
+        return value
+
+    return rebase(spec)
+
+
+def load_spec(path: str) -> Dict[str, Any]:
+    """读取JSON或YAML格式的爬虫定义"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError(f"读取 {path} 需要安装PyYAML")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def load_specs(spec_dir: str = SPEC_DIR) -> List[Dict[str, Any]]:
+    """读取目录下所有爬虫定义，按文件名排序"""
+    if not os.path.isdir(spec_dir):
+        return []
+
+    specs = []
+    for name in sorted(os.listdir(spec_dir)):
+        if name.endswith(SPEC_SUFFIXES):
+            try:
+                specs.append(load_spec(os.path.join(spec_dir, name)))
+            except (OSError, ValueError, ImportError) as e:
+                print(f"读取爬虫定义 {name} 失败: {str(e)}")
+    return specs
+
+
+class DeclarativeScraper(BaseScraper):
+    """
+    由声明式定义驱动的爬虫
+    定义在创建时编译为字段提取器，列表翻页、详情和收益抓取由通用流程完成
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        super().__init__(spec["company_name"], spec["base_url"])
+        self.spec = spec
+        self.parser_backend = spec.get("parser_backend", self.parser_backend)
+        self.fetch_backend = spec.get("fetch_backend", self.fetch_backend)
+        self.browser_wait_selector = spec.get("wait_for", self.browser_wait_selector)
+
+        list_spec = spec.get("list", {})
+        self.product_list_url = list_spec.get("url")
+        self.page_param = list_spec.get("page_param", "page")
+        self.next_page_selector = list_spec.get("next_page")
+        self.list_extractor = RecordExtractor(list_spec, self.base_url)
+
+        # 可选的JSON列表接口，配置后优先使用，失败时改用HTML翻页
+        self.list_api = spec.get("list_api")
+        self.list_api_extractor = RecordExtractor(self.list_api, self.base_url) if self.list_api else None
+
+        detail_spec = spec.get("detail")
+        self.detail_extractor = RecordExtractor(detail_spec, self.base_url) if detail_spec else None
+
+        returns_spec = spec.get("returns")
+        self.returns_url = returns_spec.get("url") if returns_spec else None
+        self.returns_items = returns_spec.get("items", "data") if returns_spec else None
+        self.returns_extractor = RecordExtractor(returns_spec, self.base_url) if returns_spec else None
+
+    def get_list_page_url(self, page: int) -> str:
+        """构造第page页产品列表的地址"""
+        separator = "&" if "?" in self.product_list_url else "?"
+        return f"{self.product_list_url}{separator}{self.page_param}={page}"
+
+    def get_product_list(self) -> List[Dict[str, Any]]:
+        """获取产品列表，配置了JSON列表接口时优先使用接口"""
+        if not self.product_list_url and not self.list_api:
+            return []
+
+        print(f"开始获取{self.company_name}产品列表...")
+
+        products = []
+        page = 1
+        has_more = True
+
+        # 从断点继续翻页
+        if self.checkpoint:
+            last_page, products = self.checkpoint.get_list_progress()
+            if self.checkpoint.list_complete:
+                print(f"从断点恢复产品列表，共 {len(products)} 个产品")
+                return products
+            if last_page:
+                page = last_page + 1
+                print(f"从第 {page} 页继续获取产品列表...")
+
+        # HTML翻页已进行到一半时继续翻页，否则先尝试JSON接口
+        if self.list_api and page == 1:
+            api_products = self.get_product_list_from_api()
+            if api_products is not None:
+                if self.checkpoint:
+                    self.checkpoint.record_list_page(1, api_products)
+                    self.checkpoint.finish_list()
+                print(f"共获取到 {len(api_products)} 个产品")
+                return api_products
+            if not self.product_list_url:
+                return []
+            print("JSON列表接口不可用，改用HTML翻页")
+
+        while has_more:
+            soup = self.get_page(self.get_list_page_url(page), self.list_extractor.sections)
+
+            if not soup:
+                print(f"获取第 {page} 页产品列表失败")
+                break
+
+            with self.stage(STAGE_EXTRACT):
+                page_products = self.list_extractor.extract_items(soup)
+
+            if not page_products:
+                print(f"第 {page} 页没有找到产品")
+                if self.checkpoint:
+                    self.checkpoint.finish_list()
+                break
+
+            for product in page_products:
+                # 设置公司信息
+                product['company_name'] = self.company_name
+                product['company_url'] = self.company_url
+
+            products.extend(page_products)
+            if self.checkpoint:
+                self.checkpoint.record_list_page(page, page_products)
+
+            # 判断是否有下一页
+            if not self.next_page_selector or not soup.select_one(self.next_page_selector):
+                has_more = False
+                if self.checkpoint:
+                    self.checkpoint.finish_list()
+            else:
+                page += 1
+
+        print(f"共获取到 {len(products)} 个产品")
+        return products
+
+    def get_product_list_from_api(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        通过JSON列表接口获取全部产品
+        第一页返回总数后其余页面并发请求；页数按第一页实际返回的条数计算，
+        接口在服务端限制了每页条数时也不会漏页。接口不可用、任一页失败或取到的条数少于总数时返回None
+        """
+        first = self._fetch_list_api_page(1)
+        if first is None:
+            return None
+        items, total = first
+        pages = [items]
+        # 服务端可能把每页条数限制在请求的page_size以下，以第一页实际条数为准
+        page_size = len(items)
+
+        if total is not None:
+            page_count = math.ceil(total / page_size) if page_size else 1
+            if page_count > 1:
+                print(f"产品总数 {total}，每页 {page_size} 条，并发获取剩余 {page_count - 1} 页...")
+                concurrency = self.list_api.get("concurrency", LIST_API_CONCURRENCY)
+                with ThreadPoolExecutor(max_workers=min(concurrency, page_count - 1)) as executor:
+                    results = list(executor.map(self._fetch_list_api_page, range(2, page_count + 1)))
+                if any(result is None for result in results):
+                    return None
+                pages.extend(result[0] for result in results)
+
+            received = sum(len(page_items) for page_items in pages)
+            if received < total:
+                print(f"产品列表接口只返回了 {received}/{total} 个产品")
+                return None
+        else:
+            # 接口不返回总数时逐页请求，直到某页为空或少于第一页的条数
+            page = 1
+            while items and len(items) >= page_size:
+                page += 1
+                result = self._fetch_list_api_page(page)
+                if result is None:
+                    return None
+                items = result[0]
+                pages.append(items)
+
+        products = []
+        seen = set()
+        with self.stage(STAGE_EXTRACT):
+            for items in pages:
+                for item in items:
+                    product = self.list_api_extractor.extract_json(item)
+                    if not all(key in product for key in self.list_api_extractor.required):
+                        continue
+                    # 翻页期间数据变化可能导致相邻页重复
+                    code = product.get('product_code')
+                    if code in seen:
+                        continue
+                    seen.add(code)
+
+                    # 设置公司信息
+                    product['company_name'] = self.company_name
+                    product['company_url'] = self.company_url
+                    products.append(product)
+
+        return products
+
+    def _fetch_list_api_page(self, page: int) -> Optional[Tuple[List[Dict[str, Any]], Optional[int]]]:
+        """请求JSON列表接口的一页，返回(条目列表, 产品总数)"""
+        params = dict(self.list_api.get("params", {}))
+        params[self.list_api.get("page_param", "page")] = page
+        params[self.list_api.get("page_size_param", "pageSize")] = self.list_api.get("page_size", LIST_API_PAGE_SIZE)
+
+        method = self.list_api.get("method", "GET").upper()
+        with self.stage(STAGE_FETCH):
+            if method == "POST":
+                # 列表查询是只读的，可以安全重试
+                text = fetch_page(self.list_api["url"], method="POST", data=params, idempotent=True)
+            else:
+                text = fetch_page(self.list_api["url"], params=params)
+        if not text:
+            print(f"请求产品列表接口第 {page} 页失败")
+            return None
+
+        try:
+            with self.stage(STAGE_PARSE):
+                data = json.loads(text)
+        except json.JSONDecodeError:
+            print(f"产品列表接口第 {page} 页不是JSON")
+            return None
+
+        items = get_json_path(data, self.list_api.get("items", "data"))
+        if not isinstance(items, list):
+            print(f"产品列表接口第 {page} 页没有找到产品列表")
+            return None
+
+        total = get_json_path(data, self.list_api["total"]) if self.list_api.get("total") else None
+        try:
+            total = int(total) if total is not None else None
+        except (TypeError, ValueError):
+            total = None
+        return items, total
+
+    def get_product_details(self, product_url: str) -> Optional[Dict[str, Any]]:
+        """获取产品详情，页面获取失败时返回None"""
+        if not self.detail_extractor:
+            return {}
+
+        print(f"获取产品详情: {product_url}")
+
+        soup = self.get_page(product_url, self.detail_extractor.sections)
+        if not soup:
+            print(f"获取产品详情页面失败: {product_url}")
+            return None
+
+        with self.stage(STAGE_EXTRACT):
+            details = self.detail_extractor.extract(soup)
+
+        # 记录最后更新日期
+        details['last_update'] = get_today()
+
+        return details
+
+    def get_returns_url(self) -> str:
+        """定义中的收益接口地址"""
+        return self.returns_url or self.base_url
+
+    def get_product_returns(self, product_code: str, days: int = 30) -> Optional[List[Dict[str, Any]]]:
+        """按定义中的收益接口获取产品收益信息，接口返回JSON，请求或解析失败时返回None"""
+        if not self.returns_extractor:
+            return []
+
+        print(f"获取产品 {product_code} 的收益信息...")
+
+        today = get_today()
+        url = self.returns_url.format(
+            product_code=product_code,
+            start_date=(today - datetime.timedelta(days=days)).strftime("%Y-%m-%d"),
+            end_date=today.strftime("%Y-%m-%d"),
+        )
+
+        with self.stage(STAGE_FETCH):
+            html = fetch_page(url)
+        if not html:
+            print(f"获取产品 {product_code} 收益信息失败")
+            return None
+
+        try:
+            with self.stage(STAGE_PARSE):
+                data = json.loads(html)
+        except json.JSONDecodeError:
+            print(f"解析产品 {product_code} 收益数据失败")
+            return None
+
+        # items为点分隔的路径，如 "data.list"
+        data = get_json_path(data, self.returns_items)
+        if not data:
+            print(f"产品 {product_code} 收益数据为空")
+            return []
+
+        returns = []
+        with self.stage(STAGE_EXTRACT):
+            for item in data:
+                return_info = self.returns_extractor.extract_json(item)
+                if return_info.get('date'):  # 确保日期有效
+                    return_info['product_code'] = product_code
+                    returns.append(return_info)
+
+        print(f"获取到产品 {product_code} 的 {len(returns)} 条收益记录")
+        return returns
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试直接从项目根目录导入 utils、models 等包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,161 @@
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.browser_pool import BrowserPool
+from utils.rate_limiter import get_rate_limiter
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """/error 返回500，其他路径返回包含路径的页面"""
+
+    def do_GET(self):
+        if self.path == "/error":
+            self.send_error(500)
+            return
+        body = f"<html><body><p class=\"path\">{self.path}</p></body></html>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubDriver:
+    """用urllib代替浏览器加载页面，接口与selenium的WebDriver一致"""
+
+    instances = []
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+
+    def __init__(self, **options):
+        self.options = options
+        self.page_source = None
+        self.loaded = []
+        self.quit_called = False
+        with StubDriver.lock:
+            StubDriver.instances.append(self)
+
+    def get(self, url):
+        with StubDriver.lock:
+            StubDriver.active += 1
+            StubDriver.max_active = max(StubDriver.max_active, StubDriver.active)
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                self.page_source = response.read().decode("utf-8")
+            self.loaded.append(url)
+        finally:
+            with StubDriver.lock:
+                StubDriver.active -= 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host = f"127.0.0.1:{server.server_address[1]}"
+    # 本地测试服务器不限速
+    get_rate_limiter().configure_host(host, rate=1000, burst=1000)
+    yield f"http://{host}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pool():
+    StubDriver.instances = []
+    StubDriver.active = StubDriver.max_active = 0
+    pools = []
+
+    def create(**kwargs):
+        pools.append(BrowserPool(driver_factory=StubDriver, **kwargs))
+        return pools[-1]
+
+    yield create
+    for browser_pool in pools:
+        browser_pool.close()
+
+
+def test_checkout_reuses_idle_browser(base_url, pool):
+    browser_pool = pool(size=1, recycle_after=10, headless=False)
+
+    for i in range(3):
+        html = browser_pool.fetch(f"{base_url}/page{i}")
+        assert f"/page{i}" in html
+
+    assert len(StubDriver.instances) == 1
+    driver = StubDriver.instances[0]
+    assert len(driver.loaded) == 3
+    assert driver.options["headless"] is False
+    assert browser_pool.stats() == {"browsers_started": 1, "browsers_recycled": 0, "pages": 3,
+                                    "errors": 0, "open_browsers": 1}
+
+
+def test_browser_recycled_after_page_limit(base_url, pool):
+    browser_pool = pool(size=1, recycle_after=2)
+
+    for i in range(5):
+        assert browser_pool.fetch(f"{base_url}/page{i}")
+
+    assert [len(driver.loaded) for driver in StubDriver.instances] == [2, 2, 1]
+    assert [driver.quit_called for driver in StubDriver.instances] == [True, True, False]
+    stats = browser_pool.stats()
+    assert stats["browsers_started"] == 3
+    assert stats["browsers_recycled"] == 2
+    assert stats["open_browsers"] == 1
+
+
+def test_browser_discarded_after_error(base_url, pool):
+    browser_pool = pool(size=1, recycle_after=10)
+
+    assert browser_pool.fetch(f"{base_url}/page") is not None
+    assert browser_pool.fetch(f"{base_url}/error") is None
+
+    failed = StubDriver.instances[0]
+    assert failed.quit_called
+    assert browser_pool.stats()["errors"] == 1
+    assert browser_pool.stats()["open_browsers"] == 0
+
+    # 下一次请求启动新的浏览器
+    assert browser_pool.fetch(f"{base_url}/page") is not None
+    assert len(StubDriver.instances) == 2
+    assert not StubDriver.instances[1].quit_called
+    assert browser_pool.stats()["browsers_recycled"] == 0
+
+
+def test_pool_size_limits_open_browsers(base_url, pool):
+    browser_pool = pool(size=2, recycle_after=0)
+    results = []
+
+    def worker(i):
+        results.append(browser_pool.fetch(f"{base_url}/page{i}"))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results) and len(results) == 8
+    assert StubDriver.max_active <= 2
+    assert len(StubDriver.instances) <= 2
+    assert browser_pool.stats()["pages"] == 8
+
+
+def test_close_quits_all_browsers(base_url, pool):
+    browser_pool = pool(size=2)
+    browser_pool.fetch(f"{base_url}/page")
+    browser_pool.close()
+
+    assert all(driver.quit_called for driver in StubDriver.instances)
+    assert browser_pool.stats()["open_browsers"] == 0
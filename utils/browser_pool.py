@@ -0,0 +1,206 @@
+import queue
+import atexit
+import threading
+from typing import Optional, Callable
+
+from .rate_limiter import get_rate_limiter
+
+# 默认同时打开的无头浏览器数量
+DEFAULT_POOL_SIZE = 2
+
+# 每个浏览器加载多少个页面后重启，避免内存持续增长
+DEFAULT_RECYCLE_AFTER = 50
+
+# 页面加载和等待元素出现的超时时间（秒）
+PAGE_LOAD_TIMEOUT = 30
+WAIT_TIMEOUT = 10
+
+# 不需要加载的资源，渲染产品数据用不到图片和字体
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+]
+
+
+def create_chrome_driver(headless: bool = True, block_resources: bool = True,
+                         page_load_timeout: float = PAGE_LOAD_TIMEOUT):
+    """创建Chrome浏览器，优先使用webdriver-manager下载匹配的驱动"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    options = Options()
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-extensions")
+    if block_resources:
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+        })
+
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        service = Service(ChromeDriverManager().install())
+    except Exception as e:
+        # 没有webdriver-manager或无法下载时使用PATH中的chromedriver
+        print(f"无法通过webdriver-manager获取驱动，使用系统chromedriver: {str(e)}")
+        service = Service()
+
+    driver = webdriver.Chrome(service=service, options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+
+    if block_resources:
+        # 通过DevTools协议在网络层拦截字体等资源
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        except Exception as e:
+            print(f"无法设置资源拦截: {str(e)}")
+
+    return driver
+
+
+class PooledBrowser:
+    """池中的单个浏览器，记录已加载的页面数"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """
+    可复用的无头浏览器池
+    浏览器按需启动，最多同时打开size个；每个浏览器加载recycle_after个页面后关闭重建，
+    出错的浏览器直接丢弃，由下一次请求重新启动
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, recycle_after: int = DEFAULT_RECYCLE_AFTER,
+                 headless: bool = True, block_resources: bool = True,
+                 page_load_timeout: float = PAGE_LOAD_TIMEOUT,
+                 driver_factory: Optional[Callable] = None):
+        self.size = size
+        self.recycle_after = recycle_after
+        self.headless = headless
+        self.block_resources = block_resources
+        self.page_load_timeout = page_load_timeout
+        self.driver_factory = driver_factory or create_chrome_driver
+        self._idle: "queue.LifoQueue[PooledBrowser]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._browsers = set()
+        self._lock = threading.Lock()
+        self._stats = {"browsers_started": 0, "browsers_recycled": 0, "pages": 0, "errors": 0}
+
+    def fetch(self, url: str, wait_for: Optional[str] = None, timeout: float = WAIT_TIMEOUT) -> Optional[str]:
+        """
+        用池中的浏览器加载页面，返回渲染后的HTML
+        wait_for为CSS选择器时等待该元素出现后再读取页面，失败时返回None
+        """
+        get_rate_limiter().acquire(url)
+
+        self._slots.acquire()
+        browser = None
+        try:
+            browser = self._checkout()
+            browser.driver.get(url)
+            if wait_for:
+                self._wait_for(browser.driver, wait_for, timeout)
+            html = browser.driver.page_source
+            browser.pages += 1
+            with self._lock:
+                self._stats["pages"] += 1
+            return html
+        except Exception as e:
+            print(f"浏览器加载页面 {url} 失败: {str(e)}")
+            with self._lock:
+                self._stats["errors"] += 1
+            # 出错后浏览器状态不可信，直接丢弃
+            if browser is not None:
+                self._discard(browser)
+                browser = None
+            return None
+        finally:
+            if browser is not None:
+                self._checkin(browser)
+            self._slots.release()
+
+    def stats(self):
+        """浏览器池统计信息"""
+        with self._lock:
+            return dict(self._stats, open_browsers=len(self._browsers))
+
+    def close(self):
+        """关闭所有浏览器"""
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        with self._lock:
+            browsers, self._browsers = self._browsers, set()
+        for browser in browsers:
+            browser.quit()
+
+    def _checkout(self) -> PooledBrowser:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        driver = self.driver_factory(headless=self.headless, block_resources=self.block_resources,
+                                     page_load_timeout=self.page_load_timeout)
+        browser = PooledBrowser(driver)
+        with self._lock:
+            self._browsers.add(browser)
+            self._stats["browsers_started"] += 1
+        return browser
+
+    def _checkin(self, browser: PooledBrowser):
+        if self.recycle_after and browser.pages >= self.recycle_after:
+            self._discard(browser)
+            with self._lock:
+                self._stats["browsers_recycled"] += 1
+        else:
+            self._idle.put(browser)
+
+    def _discard(self, browser: PooledBrowser):
+        with self._lock:
+            self._browsers.discard(browser)
+        browser.quit()
+
+    def _wait_for(self, driver, selector: str, timeout: float):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        WebDriverWait(driver, timeout).until(
+            expected_conditions.presence_of_element_located((By.CSS_SELECTOR, selector))
+        )
+
+
+# 全局共享的浏览器池，首次使用时启动浏览器
+browser_pool = BrowserPool()
+atexit.register(lambda: browser_pool.close())
+
+
+def configure_browser_pool(**kwargs) -> BrowserPool:
+    """按新配置替换全局浏览器池，已打开的浏览器会被关闭"""
+    global browser_pool
+    browser_pool.close()
+    browser_pool = BrowserPool(**kwargs)
+    return browser_pool
+
+
+def get_browser_pool() -> BrowserPool:
+    """获取全局浏览器池"""
+    return browser_pool
@@ -0,0 +1,118 @@
+import os
+import re
+import json
+import threading
+import datetime
+from typing import Dict, Any, List, Tuple
+
+# 断点文件的默认目录
+DEFAULT_CHECKPOINT_DIR = ".checkpoints"
+
+# 产品的抓取阶段
+STAGE_DETAILS = "details"
+STAGE_RETURNS = "returns"
+
+
+class CheckpointStore:
+    """
+    爬虫断点记录
+    以追加写入的JSON行文件记录产品列表的翻页进度和每个产品各阶段的完成情况，
+    中断后可从断点继续抓取
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.list_pages: Dict[int, List[Dict[str, Any]]] = {}
+        self.list_complete = False
+        self.finished = False
+        self.completed: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_scraper(cls, company_name: str, checkpoint_dir: str = DEFAULT_CHECKPOINT_DIR) -> "CheckpointStore":
+        """按理财公司名称创建断点记录"""
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        safe_name = re.sub(r'[\\/:*?"<>|\s]+', '_', company_name)
+        return cls(os.path.join(checkpoint_dir, f"{safe_name}.jsonl"))
+
+    def load(self) -> "CheckpointStore":
+        """读取已有的断点记录"""
+        self._clear_state()
+        if not os.path.exists(self.path):
+            return self
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # 中断时可能写了半行，忽略
+                    continue
+                self._apply(event)
+        return self
+
+    def reset(self) -> "CheckpointStore":
+        """清空断点记录，开始新的一次抓取"""
+        with self._lock:
+            self._clear_state()
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(self._dump({"event": "start", "time": datetime.datetime.now().isoformat()}))
+        return self
+
+    def get_list_progress(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """获取产品列表的翻页进度，返回最后完成的页码和已获取的产品"""
+        products = []
+        for page in sorted(self.list_pages):
+            products.extend(self.list_pages[page])
+        return max(self.list_pages, default=0), products
+
+    def record_list_page(self, page: int, products: List[Dict[str, Any]]):
+        """记录一页产品列表"""
+        self._append({"event": "list_page", "page": page, "products": products})
+
+    def finish_list(self):
+        """记录产品列表已全部获取"""
+        self._append({"event": "list_done"})
+
+    def is_done(self, product_code: str, stage: str) -> bool:
+        """判断产品某个阶段是否已完成"""
+        return stage in self.completed.get(product_code, ())
+
+    def mark_done(self, product_codes: List[str], stage: str):
+        """记录一批产品的某个阶段已完成"""
+        codes = [code for code in product_codes if code and not self.is_done(code, stage)]
+        if codes:
+            self._append({"event": "done", "stage": stage, "codes": codes})
+
+    def mark_finished(self):
+        """记录本次抓取已全部完成"""
+        self._append({"event": "finished", "time": datetime.datetime.now().isoformat()})
+
+    def _append(self, event: Dict[str, Any]):
+        with self._lock:
+            self._apply(event)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(self._dump(event))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _apply(self, event: Dict[str, Any]):
+        kind = event.get("event")
+        if kind == "list_page":
+            self.list_pages[event["page"]] = event.get("products", [])
+        elif kind == "list_done":
+            self.list_complete = True
+        elif kind == "done":
+            for code in event.get("codes", []):
+                self.completed.setdefault(code, set()).add(event["stage"])
+        elif kind == "finished":
+            self.finished = True
+
+    def _clear_state(self):
+        self.list_pages = {}
+        self.list_complete = False
+        self.finished = False
+        self.completed = {}
+
+    def _dump(self, event: Dict[str, Any]) -> str:
+        return json.dumps(event, ensure_ascii=False, default=str) + "\n"
@@ -1,12 +1,53 @@
 import re
 import datetime
+from functools import lru_cache
 from dateutil import parser as date_parser
 
+# 缓存的日期字符串数量，收益数据中同一日期会在多个产品中重复出现
+PARSE_CACHE_SIZE = 4096
+
+# 年、月、日以分隔符分开的常见格式，如 2024/1/5、2024.01.05、2024年1月5日
+_SEPARATED_DATE = re.compile(r'^(\d{4})\s*[-/.年]\s*(\d{1,2})\s*[-/.月]\s*(\d{1,2})\s*[日号]?$')
+
 def parse_date(date_str):
     """解析日期字符串为日期对象"""
     if not date_str:
         return None
     
+    if isinstance(date_str, datetime.datetime):
+        return date_str.date()
+    if isinstance(date_str, datetime.date):
+        return date_str
+    
+    return _parse_date_cached(date_str.strip())
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_date_cached(date_str):
+    """先尝试严格的固定格式，都不匹配时再用dateutil解析"""
+    date_obj = _parse_date_fast(date_str)
+    if date_obj is None:
+        date_obj = _parse_date_fallback(date_str)
+    return date_obj
+
+def _parse_date_fast(date_str):
+    """按固定格式解析，不匹配或日期无效时返回None"""
+    try:
+        length = len(date_str)
+        # YYYY-MM-DD，以及带时间的 YYYY-MM-DD HH:MM:SS
+        if length >= 10 and date_str[4] == '-' and date_str[7] == '-' and (length == 10 or date_str[10] in ' T'):
+            return datetime.date.fromisoformat(date_str[:10])
+        # YYYYMMDD
+        if length == 8 and date_str.isdigit():
+            return datetime.date(int(date_str[:4]), int(date_str[4:6]), int(date_str[6:]))
+        match = _SEPARATED_DATE.match(date_str)
+        if match:
+            return datetime.date(*map(int, match.groups()))
+    except ValueError:
+        pass
+    return None
+
+def _parse_date_fallback(date_str):
+    """清理中文字符后用dateutil解析，支持各种不规则格式"""
     # 清理日期字符串
     date_str = re.sub(r'[\u4e00-\u9fa5]+', '', date_str).strip()
     date_str = re.sub(r'[年月]', '-', date_str)
@@ -0,0 +1,18 @@
+import json
+import hashlib
+from typing import Dict, Any, Iterable
+
+# 不参与指纹计算的字段：抓取时间、指纹本身和数据库字段
+VOLATILE_FIELDS = frozenset(["id", "last_update", "list_hash", "content_hash", "details_checked"])
+
+
+def fingerprint(record: Dict[str, Any], exclude: Iterable[str] = VOLATILE_FIELDS) -> str:
+    """
+    计算记录内容的指纹
+    字段按名称排序后序列化，空值字段忽略，字段顺序和缺失的空字段不影响结果
+    """
+    exclude = frozenset(exclude)
+    content = {key: value for key, value in record.items() if key not in exclude and value is not None}
+    payload = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
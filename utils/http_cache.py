@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+# 缓存目录的默认大小上限（字节）
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# 未匹配任何规则时的缓存有效期（秒）
+DEFAULT_TTL = 3600
+
+# 按URL模式设置的缓存有效期（秒），按顺序匹配第一条规则，0表示每次都向服务器重新验证
+DEFAULT_TTL_RULES = [
+    (r'yield|return', 0),             # 收益数据每日变化
+    (r'detail', 24 * 3600),           # 产品详情页
+    (r'\.(jsp|html?)(\?|$)', 6 * 3600),  # 产品列表页
+]
+
+
+class CacheEntry:
+    """缓存的响应"""
+
+    def __init__(self, key: str, meta: Dict[str, Any], text: str):
+        self.key = key
+        self.url = meta.get("url")
+        self.etag = meta.get("etag")
+        self.last_modified = meta.get("last_modified")
+        self.stored_at = meta.get("stored_at", 0)
+        self.text = text
+
+
+class HttpCache:
+    """
+    基于磁盘的HTTP响应缓存
+    支持ETag/Last-Modified条件请求、按URL模式的有效期、按大小上限的LRU淘汰，
+    以及完全不访问网络的离线回放模式
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl_rules: Optional[List[Tuple[str, int]]] = None,
+                 default_ttl: int = DEFAULT_TTL, offline: bool = False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_rules = [(re.compile(pattern), ttl) for pattern, ttl in (ttl_rules or DEFAULT_TTL_RULES)]
+        self.default_ttl = default_ttl
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # 内存中的LRU索引: key -> (最近访问时间, 大小)
+        self._index: Dict[str, Tuple[float, int]] = {}
+        self._total_bytes = 0
+        self._load_index()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """读取缓存条目，不存在时返回None"""
+        key = self._key(url)
+        meta_path, body_path = self._paths(key)
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self._touch(key, meta_path)
+        self.hits += 1
+        return CacheEntry(key, meta, text)
+
+    def get_ttl(self, url: str) -> int:
+        """获取URL对应的缓存有效期"""
+        for pattern, ttl in self.ttl_rules:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """判断缓存条目是否仍在有效期内"""
+        return time.time() - entry.stored_at < self.get_ttl(entry.url)
+
+    def validation_headers(self, entry: Optional[CacheEntry]) -> Dict[str, str]:
+        """生成条件请求头"""
+        headers = {}
+        if entry:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, url: str, text: str, headers: Optional[Dict[str, str]] = None):
+        """保存响应内容"""
+        headers = headers or {}
+        cache_control = headers.get('Cache-Control', '')
+        if 'no-store' in cache_control:
+            return
+
+        key = self._key(url)
+        meta = {
+            "url": url,
+            "etag": headers.get('ETag'),
+            "last_modified": headers.get('Last-Modified'),
+            "stored_at": time.time(),
+        }
+        meta_path, body_path = self._paths(key)
+
+        self._write(body_path, text)
+        self._write(meta_path, json.dumps(meta, ensure_ascii=False))
+
+        size = os.path.getsize(body_path) + os.path.getsize(meta_path)
+        with self._lock:
+            _, old_size = self._index.get(key, (0, 0))
+            self._index[key] = (time.time(), size)
+            self._total_bytes += size - old_size
+        self._evict()
+
+    def revalidate(self, entry: CacheEntry, headers: Optional[Dict[str, str]] = None):
+        """收到304响应后刷新缓存条目的时间和校验信息"""
+        headers = headers or {}
+        self.revalidated += 1
+        self.store(entry.url, entry.text, {
+            'ETag': headers.get('ETag') or entry.etag,
+            'Last-Modified': headers.get('Last-Modified') or entry.last_modified,
+        })
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return {
+            "entries": len(self._index),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+        }
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        directory = os.path.join(self.cache_dir, key[:2])
+        return os.path.join(directory, key + '.json'), os.path.join(directory, key + '.body')
+
+    def _write(self, path: str, text: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def _touch(self, key: str, meta_path: str):
+        now = time.time()
+        try:
+            # 用元数据文件的修改时间记录最近访问时间，重启后可恢复LRU顺序
+            os.utime(meta_path, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            if key in self._index:
+                self._index[key] = (now, self._index[key][1])
+
+    def _load_index(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                key = name[:-5]
+                meta_path = os.path.join(root, name)
+                body_path = os.path.join(root, key + '.body')
+                try:
+                    size = os.path.getsize(meta_path) + os.path.getsize(body_path)
+                    accessed = os.path.getmtime(meta_path)
+                except OSError:
+                    continue
+                self._index[key] = (accessed, size)
+                self._total_bytes += size
+
+    def _evict(self):
+        """超过大小上限时按最近访问时间淘汰，直到降到上限的90%"""
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            target = self.max_bytes * 0.9
+            for key, (_, size) in sorted(self._index.items(), key=lambda item: item[1][0]):
+                if self._total_bytes <= target:
+                    break
+                for path in self._paths(key):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                del self._index[key]
+                self._total_bytes -= size
+
+
+# 全局HTTP缓存，默认不启用
+_http_cache: Optional[HttpCache] = None
+
+
+def configure_http_cache(cache_dir: Optional[str], **kwargs) -> Optional[HttpCache]:
+    """启用或关闭全局HTTP缓存，cache_dir为None时关闭"""
+    global _http_cache
+    _http_cache = HttpCache(cache_dir, **kwargs) if cache_dir else None
+    return _http_cache
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    """获取全局HTTP缓存"""
+    return _http_cache
@@ -0,0 +1,153 @@
+import random
+import threading
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 每个主机的连接池默认大小
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+# 用户代理轮换列表的大小
+USER_AGENT_POOL_SIZE = 50
+
+# fake-useragent不可用时使用的备用用户代理
+FALLBACK_USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:103.0) Gecko/20100101 Firefox/103.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.6 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36',
+]
+
+_user_agents = None
+_user_agents_lock = threading.Lock()
+
+
+def get_user_agents():
+    """获取缓存的用户代理轮换列表，只在首次调用时加载fake-useragent"""
+    global _user_agents
+    if _user_agents is None:
+        with _user_agents_lock:
+            if _user_agents is None:
+                try:
+                    from fake_useragent import UserAgent
+                    ua = UserAgent()
+                    agents = list({ua.random for _ in range(USER_AGENT_POOL_SIZE)})
+                except Exception as e:
+                    print(f"加载用户代理失败，使用备用列表: {str(e)}")
+                    agents = []
+                _user_agents = agents or list(FALLBACK_USER_AGENTS)
+    return _user_agents
+
+
+def rotate_user_agent():
+    """从缓存列表中随机选择一个用户代理"""
+    return random.choice(get_user_agents())
+
+
+class SessionPool:
+    """线程安全的HTTP会话池，每个主机复用一个带连接池的会话"""
+
+    def __init__(self, pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, pool_connections: Optional[int] = None, pool_maxsize: Optional[int] = None):
+        """调整连接池大小，已创建的会话会被关闭并按新配置重建"""
+        with self._lock:
+            if pool_connections:
+                self.pool_connections = pool_connections
+            if pool_maxsize:
+                self.pool_maxsize = pool_maxsize
+            self._close_sessions()
+
+    def get_session(self, url: str) -> requests.Session:
+        """获取URL所在主机的会话"""
+        parsed = urlparse(url)
+        key = f"{parsed.scheme}://{parsed.netloc}"
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._create_session()
+                    self._sessions[key] = session
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """通过对应主机的会话发送请求"""
+        return self.get_session(url).request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """发送GET请求"""
+        return self.request('GET', url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取连接池统计信息
+        包括请求数、新建连接数、连接复用率和当前打开的连接数
+        """
+        requests_count = 0
+        connections_count = 0
+        open_connections = 0
+
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        for session in sessions:
+            # http和https挂载的是同一个适配器，按对象去重
+            adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+            for adapter in adapters.values():
+                pools = adapter.poolmanager.pools
+                for key in list(pools.keys()):
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    requests_count += pool.num_requests
+                    connections_count += pool.num_connections
+                    open_connections += sum(
+                        1 for conn in list(pool.pool.queue)
+                        if conn is not None and getattr(conn, 'sock', None) is not None
+                    )
+
+        reused = max(requests_count - connections_count, 0)
+        return {
+            "hosts": len(sessions),
+            "requests": requests_count,
+            "connections_created": connections_count,
+            "connections_reused": reused,
+            "reuse_ratio": reused / requests_count if requests_count else 0.0,
+            "open_connections": open_connections,
+        }
+
+    def close(self):
+        """关闭所有会话"""
+        with self._lock:
+            self._close_sessions()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _close_sessions(self):
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+
+
+# 全局共享的会话池
+session_pool = SessionPool()
+
+
+def get_session_pool() -> SessionPool:
+    """获取全局会话池"""
+    return session_pool
@@ -0,0 +1,335 @@
+import os
+import re
+import json
+import time
+import bisect
+import datetime
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlparse
+
+# 直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 指标名称
+HTTP_REQUEST_SECONDS = "http_request_duration_seconds"
+HTTP_WAIT_SECONDS = "http_rate_limit_wait_seconds"
+HTTP_REQUESTS = "http_requests_total"
+HTTP_BYTES = "http_response_bytes_total"
+HTTP_RETRIES = "http_retries_total"
+HTTP_ERRORS = "http_errors_total"
+HTTP_CACHE_HITS = "http_cache_hits_total"
+PARSE_SECONDS = "html_parse_seconds"
+DB_WRITE_SECONDS = "db_write_seconds"
+DB_ROWS = "db_rows_written_total"
+SCRAPER_SECONDS = "scraper_run_seconds"
+SCRAPER_RECORDS = "scraper_records_total"
+SCRAPER_ERRORS = "scraper_errors_total"
+STAGE_SECONDS = "scraper_stage_seconds"
+ID_INDEX_LOOKUPS = "product_id_index_lookups_total"
+
+METRIC_HELP = {
+    HTTP_REQUEST_SECONDS: "HTTP请求耗时",
+    HTTP_WAIT_SECONDS: "请求前等待限速令牌的时间",
+    HTTP_REQUESTS: "HTTP请求次数",
+    HTTP_BYTES: "下载的响应字节数",
+    HTTP_RETRIES: "HTTP请求重试次数",
+    HTTP_ERRORS: "HTTP请求失败次数",
+    HTTP_CACHE_HITS: "直接使用HTTP缓存的次数",
+    PARSE_SECONDS: "HTML解析耗时",
+    DB_WRITE_SECONDS: "数据库批量写入耗时",
+    DB_ROWS: "写入数据库的记录数",
+    SCRAPER_SECONDS: "爬虫运行耗时",
+    SCRAPER_RECORDS: "爬虫抓取的记录数",
+    SCRAPER_ERRORS: "爬虫抓取失败次数",
+    STAGE_SECONDS: "请求、解析、提取和写入各阶段耗时",
+    ID_INDEX_LOOKUPS: "产品ID索引的查询次数，按命中与否区分",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def url_labels(url: str) -> Dict[str, str]:
+    """从URL得到host和endpoint标签，路径中的数字替换为占位符以控制标签数量"""
+    parsed = urlparse(url)
+    return {"host": parsed.netloc, "endpoint": re.sub(r"\d+", "{n}", parsed.path) or "/"}
+
+
+class Histogram:
+    """单个标签组合的直方图"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按分桶估算分位数，返回所在桶的上界"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def merge(self, other: Dict[str, Any]):
+        for i, count in enumerate(other["counts"]):
+            self.counts[i] += count
+        self.count += other["count"]
+        self.sum += other["sum"]
+
+
+class MetricsRegistry:
+    """
+    抓取过程的指标收集
+    计数器和直方图按标签区分，可导出为Prometheus文本格式或运行汇总JSON
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._lock = threading.Lock()
+        self.started_at = datetime.datetime.now()
+        self._started = time.perf_counter()
+
+    def reset(self):
+        """清空所有指标，开始新的一次运行"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = datetime.datetime.now()
+            self._started = time.perf_counter()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """计数器加value"""
+        key = self._key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """直方图记录一个观测值"""
+        key = self._key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """记录代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get_counter(self, name: str, **labels) -> float:
+        """获取计数器的值，不指定标签时返回所有标签组合之和"""
+        with self._lock:
+            series = self._counters.get(name, {})
+            if labels:
+                return series.get(self._key(labels), 0)
+            return sum(series.values())
+
+    def get_histogram_sum(self, name: str) -> Tuple[int, float]:
+        """获取直方图所有标签组合的总次数和总耗时"""
+        with self._lock:
+            series = self._histograms.get(name, {})
+            return sum(h.count for h in series.values()), sum(h.sum for h in series.values())
+
+    def get_stage_seconds(self) -> Dict[str, float]:
+        """按阶段汇总的累计耗时"""
+        stages: Dict[str, float] = {}
+        with self._lock:
+            for key, histogram in self._histograms.get(STAGE_SECONDS, {}).items():
+                name = dict(key).get("stage", "")
+                stages[name] = stages.get(name, 0) + histogram.sum
+        return stages
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出可跨进程传递的原始数据"""
+        with self._lock:
+            return {
+                "counters": {name: list(series.items()) for name, series in self._counters.items()},
+                "histograms": {
+                    name: [(key, {"buckets": h.buckets, "counts": list(h.counts), "count": h.count, "sum": h.sum})
+                           for key, h in series.items()]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def merge(self, snapshot: Dict[str, Any]):
+        """合并其他进程导出的指标"""
+        with self._lock:
+            for name, items in snapshot.get("counters", {}).items():
+                series = self._counters.setdefault(name, {})
+                for key, value in items:
+                    key = tuple(map(tuple, key))
+                    series[key] = series.get(key, 0) + value
+            for name, items in snapshot.get("histograms", {}).items():
+                series = self._histograms.setdefault(name, {})
+                for key, data in items:
+                    key = tuple(map(tuple, key))
+                    if key not in series:
+                        series[key] = Histogram(data["buckets"])
+                    series[key].merge(data)
+
+    def render_prometheus(self) -> str:
+        """导出Prometheus文本格式"""
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{self._format_labels(key)} {value:g}")
+            for name in sorted(self._histograms):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._format_labels(key, le=f'{bound:g}')} {cumulative}")
+                    lines.append(f"{name}_bucket{self._format_labels(key, le='+Inf')} {histogram.count}")
+                    lines.append(f"{name}_sum{self._format_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{self._format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """写入Prometheus textfile，先写临时文件再替换，避免采集到半个文件"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        本次运行的汇总
+        time_breakdown给出请求、限速等待、解析和数据库写入各自累计的耗时，
+        并发运行时各项之和可以大于墙钟时间
+        """
+        wall_seconds = time.perf_counter() - self._started
+        requests_count, request_seconds = self.get_histogram_sum(HTTP_REQUEST_SECONDS)
+        _, wait_seconds = self.get_histogram_sum(HTTP_WAIT_SECONDS)
+        pages, parse_seconds = self.get_histogram_sum(PARSE_SECONDS)
+        _, db_seconds = self.get_histogram_sum(DB_WRITE_SECONDS)
+        rows = self.get_counter(DB_ROWS)
+
+        with self._lock:
+            counters = {
+                name: [dict(key, value=value) for key, value in sorted(series.items())]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [dict(key, count=h.count, sum=round(h.sum, 6), mean=round(h.sum / h.count, 6) if h.count else None,
+                            p50=h.quantile(0.5), p95=h.quantile(0.95))
+                       for key, h in sorted(series.items())]
+                for name, series in self._histograms.items()
+            }
+
+        return {
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.datetime.now().isoformat(),
+            "wall_seconds": round(wall_seconds, 3),
+            "time_breakdown": {
+                "http_request_seconds": round(request_seconds, 3),
+                "rate_limit_wait_seconds": round(wait_seconds, 3),
+                "parse_seconds": round(parse_seconds, 3),
+                "db_write_seconds": round(db_seconds, 3),
+            },
+            "stages": {name: round(seconds, 3) for name, seconds in sorted(self.get_stage_seconds().items())},
+            "http": {
+                "requests": requests_count,
+                "bytes": self.get_counter(HTTP_BYTES),
+                "retries": self.get_counter(HTTP_RETRIES),
+                "errors": self.get_counter(HTTP_ERRORS),
+                "cache_hits": self.get_counter(HTTP_CACHE_HITS),
+            },
+            "parse": {"pages": pages},
+            "id_index": {
+                "hits": self.get_counter(ID_INDEX_LOOKUPS, result="hit"),
+                "misses": self.get_counter(ID_INDEX_LOOKUPS, result="miss"),
+            },
+            "db": {
+                "rows": rows,
+                "rows_per_second": round(rows / db_seconds, 1) if db_seconds else None,
+                "rows_per_wall_second": round(rows / wall_seconds, 1) if wall_seconds else None,
+            },
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def write_summary(self, path: str, extra: Optional[Dict[str, Any]] = None):
+        """写入运行汇总JSON"""
+        summary = self.summary()
+        if extra:
+            summary.update(extra)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2, default=str)
+
+    def start_http_exporter(self, port: int, addr: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """在后台线程中提供 /metrics 接口供Prometheus抓取"""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((addr, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def _format_labels(self, key: LabelKey, **extra) -> str:
+        items = list(key) + list(extra.items())
+        if not items:
+            return ""
+        escaped = ",".join(f'{name}="{self._escape(value)}"' for name, value in items)
+        return "{" + escaped + "}"
+
+    def _escape(self, value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# 全局共享的指标收集器
+metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """获取全局指标收集器"""
+    return metrics
@@ -1,37 +1,261 @@
 import re
+import time
+from functools import lru_cache
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-from fake_useragent import UserAgent
+from bs4 import BeautifulSoup, SoupStrainer
+from urllib.parse import urljoin, urlencode
+
+from .http_session import get_session_pool, rotate_user_agent
+from .http_cache import get_http_cache
+from .rate_limiter import get_rate_limiter, parse_retry_after
+from .retry import get_retry_policy, get_circuit_breaker
+from . import metrics as m
+
+# HTML解析后端：bs4为BeautifulSoup，lxml直接使用lxml树和预编译的CSS/XPath选择器
+PARSER_BACKENDS = ('bs4', 'lxml')
+DEFAULT_PARSER_BACKEND = 'bs4'
+
+# 预编译选择器的缓存数量
+SELECTOR_CACHE_SIZE = 256
 
 def get_random_user_agent():
     """获取随机用户代理"""
-    ua = UserAgent()
-    return ua.random
+    return rotate_user_agent()
 
-def fetch_page(url):
-    """获取页面内容"""
+def fetch_page(url, use_cache=True, params=None, method='GET', data=None, idempotent=None):
+    """
+    获取页面内容
+    启用HTTP缓存时优先使用缓存并发送条件请求；失败时按重试策略指数退避重试，
+    主机熔断期间直接返回None（有缓存时返回缓存内容）；离线模式下不发送任何请求
+    """
+    method = method.upper()
+    if params and method == 'GET':
+        # GET参数合并到URL中，使缓存按完整URL区分
+        url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+        params = None
+    
+    metrics = m.get_metrics()
+    labels = m.url_labels(url)
+    
+    http_cache = get_http_cache()
+    cache = http_cache if use_cache and method == 'GET' else None
+    if http_cache and http_cache.offline and not cache:
+        print(f"离线模式下不发送请求 {method} {url}")
+        return None
+    
+    entry = None
+    if cache:
+        entry = cache.get(url)
+        if entry and (cache.offline or cache.is_fresh(entry)):
+            metrics.inc(m.HTTP_CACHE_HITS, host=labels["host"])
+            return entry.text
+        if cache.offline:
+            print(f"离线模式下缓存中没有页面 {url}")
+            return None
+    
     headers = {
         'User-Agent': get_random_user_agent(),
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
         'Connection': 'keep-alive',
     }
+    if cache:
+        headers.update(cache.validation_headers(entry))
     
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        response.encoding = response.apparent_encoding
-        return response.text
-    except Exception as e:
-        print(f"获取页面 {url} 失败: {str(e)}")
-        return None
+    policy = get_retry_policy()
+    breaker = get_circuit_breaker()
+    attempt = 0
+    
+    while True:
+        attempt += 1
+        
+        if not breaker.allow(url):
+            print(f"主机熔断中，跳过页面 {url}")
+            return entry.text if entry else None
+        
+        try:
+            # 按主机限速，并根据响应调整速率
+            with metrics.timer(m.HTTP_WAIT_SECONDS, host=labels["host"]):
+                get_rate_limiter().acquire(url)
+            with metrics.timer(m.HTTP_REQUEST_SECONDS, **labels):
+                response = get_session_pool().request(method, url, params=params, data=data,
+                                                      headers=headers, timeout=policy.timeout)
+            metrics.inc(m.HTTP_REQUESTS, host=labels["host"], status=response.status_code)
+            metrics.inc(m.HTTP_BYTES, len(response.content), host=labels["host"])
+            retry_after = response.headers.get('Retry-After')
+            get_rate_limiter().on_response(url, response.status_code, retry_after)
+        except requests.RequestException as e:
+            breaker.record_failure(url)
+            metrics.inc(m.HTTP_ERRORS, host=labels["host"], kind=type(e).__name__)
+            if policy.should_retry(method, attempt, exception=e, idempotent=idempotent):
+                metrics.inc(m.HTTP_RETRIES, host=labels["host"], reason=type(e).__name__)
+                delay = policy.backoff(attempt)
+                print(f"获取页面 {url} 失败: {str(e)}，{delay:.1f} 秒后第 {attempt + 1} 次尝试")
+                time.sleep(delay)
+                continue
+            print(f"获取页面 {url} 失败: {str(e)}")
+            return None
+        
+        # 服务器错误计入熔断，限流只说明服务器正常但需要放慢
+        if response.status_code >= 500:
+            breaker.record_failure(url)
+        else:
+            breaker.record_success(url)
+        
+        if policy.should_retry(method, attempt, status_code=response.status_code, idempotent=idempotent):
+            metrics.inc(m.HTTP_RETRIES, host=labels["host"], reason=response.status_code)
+            delay = policy.backoff(attempt, parse_retry_after(retry_after))
+            print(f"获取页面 {url} 返回 {response.status_code}，{delay:.1f} 秒后第 {attempt + 1} 次尝试")
+            time.sleep(delay)
+            continue
+        
+        try:
+            # 页面未变化，使用缓存内容
+            if response.status_code == 304 and entry:
+                cache.revalidate(entry, response.headers)
+                return entry.text
+            
+            response.raise_for_status()
+            response.encoding = response.apparent_encoding
+            if cache:
+                cache.store(url, response.text, response.headers)
+            return response.text
+        except Exception as e:
+            metrics.inc(m.HTTP_ERRORS, host=labels["host"], kind=type(e).__name__)
+            print(f"获取页面 {url} 失败: {str(e)}")
+            return None
 
-def parse_html(html):
-    """解析HTML内容"""
+def parse_html(html, backend=DEFAULT_PARSER_BACKEND, only=None):
+    """
+    解析HTML内容
+    backend为'lxml'时返回LxmlNode，提供与BeautifulSoup相同的select/select_one/text/attrs接口；
+    only为class名称列表时只保留这些class的元素及其子元素：bs4后端其余部分不建树，
+    lxml后端仍解析整页，但之后的选择器只在保留的区域中查找
+    """
     if not html:
         return None
-    return BeautifulSoup(html, 'lxml')
+    
+    with m.get_metrics().timer(m.PARSE_SECONDS, backend=backend):
+        if backend == 'lxml':
+            try:
+                return LxmlNode.from_html(html, only)
+            except ImportError:
+                print("未安装cssselect，改用BeautifulSoup解析")
+        elif backend not in PARSER_BACKENDS:
+            raise ValueError(f"不支持的解析后端: {backend}")
+        
+        if only:
+            return BeautifulSoup(html, 'lxml', parse_only=SoupStrainer(class_=list(only)))
+        return BeautifulSoup(html, 'lxml')
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def compile_css(selector):
+    """把CSS选择器编译为XPath求值器，同一选择器只编译一次"""
+    from lxml.cssselect import CSSSelector
+    return CSSSelector(selector)
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def compile_xpath(expression):
+    """预编译XPath表达式"""
+    from lxml import etree
+    return etree.XPath(expression)
+
+class LxmlNode:
+    """lxml元素的包装，接口与BeautifulSoup的Tag保持一致，爬虫代码无需区分后端"""
+    
+    __slots__ = ('element',)
+    
+    def __init__(self, element):
+        self.element = element
+    
+    @classmethod
+    def from_html(cls, html, only=None):
+        """解析整页HTML，无法解析时返回None；only为class名称列表时只保留这些区域"""
+        import lxml.html
+        from lxml import etree
+        
+        # 提前检查cssselect，缺失时由调用方改用BeautifulSoup
+        import cssselect  # noqa: F401
+        
+        try:
+            root = lxml.html.document_fromstring(html)
+        except ValueError:
+            # 带编码声明的字符串需要先转为字节
+            root = lxml.html.document_fromstring(html.encode('utf-8'))
+        except etree.ParserError:
+            return None
+        if only:
+            root = cls._keep_sections(root, only)
+        return cls(root)
+    
+    @staticmethod
+    def _keep_sections(root, classes):
+        """把带有指定class的最外层元素移到一个新的根元素下，与SoupStrainer的结果结构一致"""
+        expression = " | ".join(
+            f"//*[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]" for name in classes
+        )
+        sections = root.makeelement('div', {})
+        kept = set()
+        for element in compile_xpath(expression)(root):
+            # 已保留元素内部的匹配随父元素一起保留
+            if any(ancestor in kept for ancestor in element.iterancestors()):
+                continue
+            kept.add(element)
+            element.tail = None
+            sections.append(element)
+        return sections
+    
+    def select(self, selector):
+        """按CSS选择器查找所有后代元素"""
+        return [LxmlNode(element) for element in compile_css(selector)(self.element)
+                if element is not self.element]
+    
+    def select_one(self, selector):
+        """按CSS选择器查找第一个后代元素"""
+        for element in compile_css(selector)(self.element):
+            if element is not self.element:
+                return LxmlNode(element)
+        return None
+    
+    def xpath(self, expression):
+        """按XPath查找，元素结果会被包装，文本和属性结果原样返回"""
+        return [LxmlNode(item) if hasattr(item, 'tag') else item
+                for item in compile_xpath(expression)(self.element)]
+    
+    @property
+    def text(self):
+        return self.element.text_content()
+    
+    def get_text(self, separator='', strip=False):
+        texts = self.element.itertext()
+        if strip:
+            texts = (text.strip() for text in texts)
+            texts = (text for text in texts if text)
+        return separator.join(texts)
+    
+    @property
+    def name(self):
+        return self.element.tag
+    
+    @property
+    def attrs(self):
+        attrs = dict(self.element.attrib)
+        # 与BeautifulSoup一致，class为列表
+        if 'class' in attrs:
+            attrs['class'] = attrs['class'].split()
+        return attrs
+    
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+    
+    def __getitem__(self, key):
+        return self.attrs[key]
+    
+    def __bool__(self):
+        return True
+    
+    def __repr__(self):
+        return f"<LxmlNode {self.element.tag}>"
 
 def extract_links(soup, base_url=None):
     """提取页面上的所有链接"""
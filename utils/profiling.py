@@ -0,0 +1,210 @@
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import datetime
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from . import metrics as m
+
+# 抓取过程的阶段：请求页面、解析HTML/JSON、提取字段、写入数据库
+STAGE_FETCH = "fetch"
+STAGE_PARSE = "parse"
+STAGE_EXTRACT = "extract"
+STAGE_PERSIST = "persist"
+
+# 不在任何阶段内的时间
+STAGE_OTHER = "other"
+
+PROFILE_MODES = ("sample", "cprofile")
+
+# 性能分析结果的默认目录
+DEFAULT_PROFILE_DIR = ".profiles"
+
+# 采样间隔（秒）
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# 报告中列出的函数数量
+REPORT_TOP = 15
+
+# 各线程当前所处的阶段栈，采样线程据此把调用栈归到阶段下
+_thread_stages: Dict[int, List[str]] = {}
+
+
+@contextmanager
+def stage(name: str, **labels):
+    """
+    标记一段代码所属的抓取阶段
+    耗时按阶段计入指标，开启采样分析时该线程的调用栈归到这个阶段下；阶段可以嵌套，以最内层为准
+    """
+    thread_id = threading.get_ident()
+    stack = _thread_stages.setdefault(thread_id, [])
+    stack.append(name)
+    try:
+        with m.get_metrics().timer(m.STAGE_SECONDS, stage=name, **labels):
+            yield
+    finally:
+        stack.pop()
+        if not stack:
+            _thread_stages.pop(thread_id, None)
+
+
+def current_stage(thread_id: int) -> Optional[str]:
+    """线程当前所处的阶段，不在任何阶段内时返回None"""
+    try:
+        return _thread_stages[thread_id][-1]
+    except (KeyError, IndexError):
+        # 该线程恰好在此时离开了阶段
+        return None
+
+
+class SamplingProfiler:
+    """
+    采样式性能分析器
+    后台线程每隔interval秒读取一次调用栈，记录为火焰图使用的折叠栈格式；
+    只采样启动分析的线程和正处于某个阶段的线程，线程池中空闲等待的线程不计入。
+    采样线程拿到GIL后才能读取调用栈，长时间持有GIL的代码（C扩展、编译过的模块）执行期间采不到样本，
+    这段时间会落到之后释放GIL的位置（如lxml解析、网络读写）；各阶段的准确耗时以stage计时为准
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.stage_samples: Counter = Counter()
+        self.leaf_samples: Counter = Counter()
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._target: Optional[int] = None
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.elapsed = time.perf_counter() - self.started
+
+    def write_folded(self, path: str):
+        """写入折叠栈文件，可用 flamegraph.pl 或 speedscope 生成火焰图"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+
+    def top_functions(self, limit: int = REPORT_TOP) -> List[Tuple[str, int]]:
+        """按自身采样数排列的函数"""
+        return self.leaf_samples.most_common(limit)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stage_name = current_stage(thread_id)
+                if stage_name is None:
+                    if thread_id != self._target:
+                        continue
+                    stage_name = STAGE_OTHER
+                self._record(stage_name, frame)
+
+    def _record(self, stage_name: str, frame):
+        frames = []
+        while frame is not None:
+            frames.append(self._label(frame.f_code))
+            frame = frame.f_back
+        if not frames:
+            return
+        frames.append(f"stage={stage_name}")
+        frames.reverse()
+        self.samples[";".join(frames)] += 1
+        self.stage_samples[stage_name] += 1
+        self.leaf_samples[frames[-1]] += 1
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+
+def _short_path(filename: str) -> str:
+    """项目内文件用相对路径，第三方库从site-packages之后开始，其他只保留文件名"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if filename.startswith(root):
+        return os.path.relpath(filename, root)
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+@contextmanager
+def profile_run(name: str, mode: str = "sample", output_dir: str = DEFAULT_PROFILE_DIR,
+                interval: float = DEFAULT_SAMPLE_INTERVAL):
+    """
+    对一次抓取进行性能分析，结束后写入结果并打印各阶段耗时
+    两种模式都写出折叠栈文件（<名称>_<时间>.folded）；cprofile模式另外对当前线程运行cProfile，
+    写出可用pstats或snakeviz查看的.prof文件，并发模式下线程池中的调用只出现在折叠栈中
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"不支持的性能分析模式: {mode}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    safe_name = re.sub(r"[^\w.-]+", "_", name)
+    prefix = os.path.join(output_dir, f"{safe_name}_{datetime.datetime.now():%Y%m%d_%H%M%S}")
+    stage_totals = m.get_metrics().get_stage_seconds()
+
+    sampler = SamplingProfiler(interval)
+    profiler = cProfile.Profile() if mode == "cprofile" else None
+    sampler.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield sampler
+    finally:
+        if profiler:
+            profiler.disable()
+        sampler.stop()
+
+        folded_path = prefix + ".folded"
+        sampler.write_folded(folded_path)
+        print(f"\n{name} 性能分析: 共 {sampler.elapsed:.1f} 秒，{sum(sampler.samples.values())} 个采样")
+        print(f"折叠栈已写入 {folded_path}")
+        if profiler:
+            profiler.dump_stats(prefix + ".prof")
+            print(f"cProfile结果已写入 {prefix}.prof")
+
+        _print_report(sampler, m.get_metrics().get_stage_seconds(), stage_totals, profiler)
+
+
+def _print_report(sampler: SamplingProfiler, after: Dict[str, float], before: Dict[str, float],
+                  profiler: Optional[cProfile.Profile]):
+    total_samples = sum(sampler.stage_samples.values()) or 1
+    seconds = {name: after[name] - before.get(name, 0) for name in after}
+    print("各阶段耗时（各线程累计，并发运行时之和可以超过总耗时）:")
+    for stage_name in sorted(set(seconds) | set(sampler.stage_samples), key=lambda s: -seconds.get(s, 0)):
+        timing = f"{seconds[stage_name]:8.2f} 秒" if stage_name in seconds else " " * 11
+        print(f"  {stage_name:<8} {timing}  采样 {sampler.stage_samples.get(stage_name, 0)}")
+
+    print("自身耗时最多的函数（采样）:")
+    for label, count in sampler.top_functions():
+        print(f"  {count / total_samples:6.1%}  {label}")
+
+    if profiler:
+        print("累计耗时最多的函数（cProfile，当前线程）:")
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(REPORT_TOP)
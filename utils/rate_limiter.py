@@ -0,0 +1,166 @@
+import time
+import threading
+import datetime
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+# 默认每个主机的初始请求速率（次/秒）和突发容量
+DEFAULT_RATE = 2.0
+DEFAULT_BURST = 4
+
+# 自适应调整的速率范围
+DEFAULT_MIN_RATE = 0.1
+DEFAULT_MAX_RATE = 10.0
+
+# 加性增、乘性减（AIMD）参数
+INCREASE_STEP = 0.05
+DECREASE_FACTOR = 0.5
+
+# 被服务器限流的状态码
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After响应头，支持秒数和HTTP日期两种格式"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max((retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    """单个主机的令牌桶"""
+
+    def __init__(self, rate: float, burst: int, min_rate: float, max_rate: float):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """取走一个令牌，返回需要等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            # 被Retry-After暂停期间不积累令牌，恢复后仍按速率逐个放行
+            start = max(now, self.blocked_until)
+            self.tokens = min(self.burst, self.tokens + max(start - self.updated, 0.0) * self.rate)
+            self.updated = max(self.updated, start)
+            self.tokens -= 1
+
+            wait = start - now
+            if self.tokens < 0:
+                wait += -self.tokens / self.rate
+            return wait
+
+    def throttle(self, retry_after: Optional[float]):
+        """服务器限流时乘性降低速率，并按Retry-After暂停"""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+            # 丢弃已积累的令牌，避免恢复后立即突发
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def relax(self):
+        """请求成功时加性提高速率"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + INCREASE_STEP)
+
+
+class HostRateLimiter:
+    """
+    按主机划分的令牌桶限速器
+    所有爬虫共享，根据429/503响应和Retry-After头自适应调整速率（AIMD）
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 min_rate: float = DEFAULT_MIN_RATE, max_rate: float = DEFAULT_MAX_RATE):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self._host_settings: Dict[str, Dict[str, float]] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, rate: Optional[float] = None, burst: Optional[int] = None,
+                  max_rate: Optional[float] = None):
+        """调整默认速率，已创建的令牌桶会按新配置重建"""
+        with self._lock:
+            if rate:
+                self.rate = rate
+            if burst:
+                self.burst = burst
+            if max_rate:
+                self.max_rate = max_rate
+            self.max_rate = max(self.max_rate, self.rate)
+            self._buckets.clear()
+
+    def configure_host(self, host: str, rate: float, burst: Optional[int] = None,
+                       max_rate: Optional[float] = None):
+        """为单个主机设置速率"""
+        with self._lock:
+            self._host_settings[host] = {
+                "rate": rate,
+                "burst": burst or self.burst,
+                "max_rate": max(max_rate or self.max_rate, rate),
+            }
+            self._buckets.pop(host, None)
+
+    def acquire(self, url: str):
+        """等待直到可以向URL所在主机发送请求"""
+        wait = self._bucket(url).reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_response(self, url: str, status_code: Optional[int], retry_after: Optional[str] = None):
+        """根据响应状态调整主机的速率"""
+        bucket = self._bucket(url)
+        if status_code in THROTTLE_STATUS_CODES:
+            bucket.throttle(parse_retry_after(retry_after))
+            print(f"主机 {urlparse(url).netloc} 限流 ({status_code})，速率降至 {bucket.rate:.2f} 次/秒")
+        elif status_code and status_code < 400:
+            bucket.relax()
+
+    def get_rate(self, url: str) -> float:
+        """获取主机当前的速率"""
+        return self._bucket(url).rate
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlparse(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(host)
+                if bucket is None:
+                    settings = self._host_settings.get(host, {})
+                    bucket = TokenBucket(
+                        settings.get("rate", self.rate),
+                        settings.get("burst", self.burst),
+                        self.min_rate,
+                        settings.get("max_rate", self.max_rate),
+                    )
+                    self._buckets[host] = bucket
+        return bucket
+
+
+# 全局共享的限速器
+rate_limiter = HostRateLimiter()
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """获取全局限速器"""
+    return rate_limiter
@@ -0,0 +1,164 @@
+import time
+import random
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+# 连接超时和读取超时（秒）
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 15
+
+# 默认重试参数
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+# 可以重试的状态码
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# 幂等的请求方法，任何失败都可以安全重试
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+# 熔断器参数：连续失败次数阈值和熔断后的恢复等待时间（秒）
+FAILURE_THRESHOLD = 5
+RECOVERY_TIMEOUT = 60.0
+
+
+class RetryPolicy:
+    """请求重试策略：指数退避加随机抖动，区分幂等与非幂等请求"""
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX, connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT, retry_status_codes: Tuple[int, ...] = RETRY_STATUS_CODES):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry_status_codes = retry_status_codes
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """传给requests的(连接超时, 读取超时)"""
+        return self.connect_timeout, self.read_timeout
+
+    def should_retry(self, method: str, attempt: int, status_code: Optional[int] = None,
+                     exception: Optional[Exception] = None, idempotent: Optional[bool] = None) -> bool:
+        """
+        判断是否应当重试
+        非幂等请求只在连接阶段失败（连接超时、连接被拒绝或无法解析主机，请求未发出）时重试
+        """
+        if attempt >= self.max_attempts:
+            return False
+
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        if exception is not None:
+            if request_not_sent(exception):
+                return True
+            if not idempotent:
+                return False
+            return isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                                          requests.exceptions.ChunkedEncodingError))
+
+        if status_code in self.retry_status_codes:
+            # 429表示请求未被处理，非幂等请求也可以重试
+            return idempotent or status_code == 429
+
+        return False
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """计算第attempt次失败后的等待时间（完全抖动的指数退避）"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+        if retry_after:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+
+def request_not_sent(exception: Exception) -> bool:
+    """判断请求是否在建立连接时就失败了，此时服务器没有收到请求"""
+    if isinstance(exception, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(exception, requests.exceptions.ConnectionError) and exception.args:
+        # requests把urllib3的MaxRetryError包装为ConnectionError，reason为实际的连接错误
+        reason = getattr(exception.args[0], "reason", exception.args[0])
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class CircuitBreaker:
+    """
+    按主机划分的熔断器
+    连续失败达到阈值后熔断，期间请求直接失败；等待恢复时间后放行一个试探请求，
+    成功则恢复，失败则继续熔断
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, recovery_timeout: float = RECOVERY_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._hosts: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, url: str) -> bool:
+        """判断是否允许向URL所在主机发送请求"""
+        with self._lock:
+            state = self._state(url)
+            if state["state"] == self.CLOSED:
+                return True
+            if state["state"] == self.OPEN and time.monotonic() - state["opened_at"] >= self.recovery_timeout:
+                # 放行一个试探请求
+                state["state"] = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self, url: str):
+        """记录一次成功请求"""
+        with self._lock:
+            state = self._state(url)
+            state["state"] = self.CLOSED
+            state["failures"] = 0
+
+    def record_failure(self, url: str):
+        """记录一次失败请求"""
+        with self._lock:
+            state = self._state(url)
+            state["failures"] += 1
+            if state["state"] == self.HALF_OPEN or state["failures"] >= self.failure_threshold:
+                if state["state"] != self.OPEN:
+                    print(f"主机 {urlparse(url).netloc} 连续失败 {state['failures']} 次，熔断 {self.recovery_timeout:.0f} 秒")
+                state["state"] = self.OPEN
+                state["opened_at"] = time.monotonic()
+
+    def get_state(self, url: str) -> str:
+        """获取主机的熔断状态"""
+        with self._lock:
+            return self._state(url)["state"]
+
+    def _state(self, url: str) -> Dict:
+        host = urlparse(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = {"state": self.CLOSED, "failures": 0, "opened_at": 0.0}
+        return self._hosts[host]
+
+
+# 全局共享的重试策略和熔断器
+retry_policy = RetryPolicy()
+circuit_breaker = CircuitBreaker()
+
+
+def get_retry_policy() -> RetryPolicy:
+    """获取全局重试策略"""
+    return retry_policy
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """获取全局熔断器"""
+    return circuit_breaker